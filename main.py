@@ -2,15 +2,24 @@ import tkinter as tk
 from tkinter import ttk, messagebox, PhotoImage, filedialog
 import q2query
 import q2rcon
+import q2poller
+import q2log
+import q2rtt
+import q2history
+import q2search
+import q2metrics
 import configparser
 import os
 import threading
 import subprocess
-import datetime
 
 CONFIG_FILE = "servers.ini"
 APP_CONFIG_FILE = "config.ini"
 LOG_FILE = "logs.txt"
+MAPS_FILE = "maps_cache.json"  # lista de mapas de cada servidor RCON
+RTT_FILE = "rtt.json"  # RTT medido de cada servidor, para ajustar los timeouts desde el inicio
+HISTORY_FILE = "history.q2h"  # historial de jugadores, ping y RTT de cada servidor
+LOG_PAGE_LINES = 500  # líneas de log que se cargan de una vez en la pestaña Logs
 
 def load_config(file_path, default_section=None):
     config = configparser.ConfigParser()
@@ -29,21 +38,45 @@ rcon_config = load_config(CONFIG_FILE)
 app_config = load_config(APP_CONFIG_FILE, "General")
 selected_server_admin = None
 
-# Variable global para el widget de logs (se asigna en create_gui)
-log_text_widget = None
+# Sesiones RCON reutilizables (una por servidor ip:puerto)
+rcon_pool = q2rcon.Q2RConnectionPool()
+
+# Comandos de la consola: pocos hilos fijos y una cola ordenada por servidor
+console_executor = q2rcon.RconExecutor(rcon_pool, max_workers=4, max_pending=16,
+                                       broadcast_workers=32)
+
+# Listas de mapas guardadas: se muestran al instante y se revalidan en segundo plano
+map_cache = q2rcon.MapListCache(rcon_pool, MAPS_FILE)
+map_cache.load()
+
+# Estimaciones de RTT de la sesión anterior
+q2rtt.rtt_table.load(RTT_FILE)
+
+# Historial alimentado por el sondeo de servidores
+history = q2history.MetricsStore(HISTORY_FILE)
+history.load()
+
+# Índice de jugadores de todos los servidores, alimentado con cada 'status' recibido
+player_index = q2search.PlayerIndex()
+q2query.status_cache.add_listener(player_index.update)
+
+# Métricas de consultas y RCON en http://127.0.0.1:<metrics_port>/metrics (desactivadas si no se configura)
+metrics_port = app_config["General"].getint("metrics_port", 0)
+if metrics_port:
+    try:
+        q2metrics.metrics.serve(metrics_port)
+    except OSError as e:
+        print("No se pudo publicar las métricas:", e)
+
+# Segundos que se reutiliza el 'status' de un servidor antes de volver a consultarlo
+q2query.status_cache.ttl = app_config["General"].getfloat("status_ttl", 5.0)
+
+# Los logs se escriben en logs.txt desde un hilo propio (ver q2log.LogWriter)
+log_writer = q2log.LogWriter(LOG_FILE)
 
 # Función para escribir logs con fecha/hora, guardar en archivo y mostrarlos en la pestaña de Logs.
 def write_log(msg):
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"{timestamp} - {msg}\n"
-    try:
-        with open(LOG_FILE, "a") as f:
-            f.write(log_entry)
-    except Exception as e:
-        print(f"Error al escribir log: {e}")
-    if log_text_widget:
-        log_text_widget.insert(tk.END, log_entry)
-        log_text_widget.see(tk.END)
+    log_writer.write(msg)
 
 def get_bg_color():
     # Si el modo oscuro está activado en el config, devuelve "#212121"; en caso contrario, usa el color por defecto.
@@ -222,12 +255,12 @@ def send_command():
         messagebox.showwarning("Advertencia", "Selecciona un servidor con configuración RCON.")
         return
     try:
-        conn = q2rcon.Q2RConnection(
-            host=selected_server_admin["ip"],
-            port=selected_server_admin["port"],
-            password=selected_server_admin["password"]
+        resp = rcon_pool.send(
+            selected_server_admin["ip"],
+            selected_server_admin["port"],
+            selected_server_admin["password"],
+            "status"
         )
-        resp = conn.send("status")
         messagebox.showinfo("Respuesta RCON", resp)
         write_log(f"Comando 'status' enviado al servidor {selected_server_admin['ip']}:{selected_server_admin['port']}")
     except Exception as e:
@@ -236,7 +269,7 @@ def send_command():
 
 # Función principal: GUI
 def create_gui(servers):
-    global selected_server_admin, rcon_config, app_config, server_tree, log_text_widget
+    global selected_server_admin, rcon_config, app_config, server_tree
     root = tk.Tk()
     root.geometry("1200x600")
     bg = get_bg_color()
@@ -255,10 +288,33 @@ def create_gui(servers):
     menu_bar.add_cascade(label="Aplicacion", menu=app_menu)
     app_menu.add_command(label="Salir", command=root.quit)
     app_menu.add_separator()
+    fetching = False
+
     def refresh_server_list():
-        nonlocal servers
-        servers = q2query.get_server_data()
+        # La lista se pide en segundo plano; mientras tanto se ve la última conocida
+        nonlocal fetching
+        if fetching:
+            return
+        fetching = True
+
+        def fetch():
+            try:
+                fetched = q2query.get_server_data()
+            except Exception as e:
+                fetched = None
+                write_log(f"Error al obtener la lista de servidores: {e}")
+            root.after(0, lambda: apply_server_list(fetched))
+        threading.Thread(target=fetch, daemon=True).start()
+
+    def apply_server_list(fetched):
+        nonlocal servers, fetching
+        fetching = False
+        if not fetched:
+            # Sin respuesta de maestros ni de la web: se conserva la lista guardada
+            return
+        servers = fetched
         update_server_tree(servers)
+        search_players()
         write_log("Lista de servidores refrescada")
     app_menu.add_command(label="Refrescar lista", command=refresh_server_list)
     
@@ -289,19 +345,118 @@ def create_gui(servers):
         server_tree.heading(col, text=col)
         server_tree.column(col, width=250 if col=="Hostname" else 100)
     
-    def update_server_tree(srv_list):
-        server_tree.delete(*server_tree.get_children())
-        for i, srv in enumerate(srv_list):
+    # Las filas se identifican por "ip:puerto"; se guarda lo último dibujado en cada una
+    servers_by_id = {}
+    row_state = {}
+    url_ids = {}
+
+    def server_id(srv):
+        # Devuelve (iid, (ip, port)); la URL de cada servidor se parsea una sola vez
+        url = srv["IP"]
+        ident = url_ids.get(url)
+        if ident is None:
             try:
-                ip, port = q2query.parse_quake2_url(srv["IP"])
-                sec = f"{ip}:{port}"
-                img = green_icon if sec in rcon_config else ""
+                ip, port = q2query.parse_quake2_url(url)
+                ident = (f"{ip}:{port}", (ip, port))
             except Exception:
-                img = ""
-            server_tree.insert("", "end", iid=str(i), text="", image=img,
-                               values=(srv["Hostname"], srv["IP"], srv["Game"], srv["Map"], srv["Players"]))
-    
+                ident = (url, None)
+            url_ids[url] = ident
+        return ident
+
+    def update_server_tree(srv_list):
+        # Se compara con lo ya dibujado y sólo se insertan, actualizan o borran las filas
+        # que cambiaron, manteniendo la selección y la posición del scroll
+        new_rows = {}
+        addresses = []
+        servers_by_id.clear()
+        for srv in srv_list:
+            iid, address = server_id(srv)
+            if iid in new_rows:
+                continue
+            if address:
+                addresses.append(address)
+            servers_by_id[iid] = srv
+            new_rows[iid] = ((srv["Hostname"], srv["IP"], srv["Game"], srv["Map"], srv["Players"]),
+                             iid in rcon_config)
+        removed = [iid for iid in row_state if iid not in new_rows]
+        if removed:
+            server_tree.delete(*removed)
+            for iid in removed:
+                del row_state[iid]
+        old_order = [iid for iid in server_tree.get_children() if iid in new_rows]
+        reordered = old_order != [iid for iid in new_rows if iid in row_state]
+        for index, (iid, row) in enumerate(new_rows.items()):
+            old = row_state.get(iid)
+            if old is None:
+                server_tree.insert("", index, iid=iid, text="", image=green_icon if row[1] else "",
+                                   values=row[0])
+            else:
+                if old != row:
+                    server_tree.item(iid, values=row[0], image=green_icon if row[1] else "")
+                if reordered:
+                    server_tree.move(iid, "", index)
+            row_state[iid] = row
+        poller.set_servers(addresses)
+
+    def on_server_status(server, state):
+        # Llamado desde el hilo del sondeo: se pasa al hilo de Tk
+        root.after(0, lambda: apply_server_status(server, state))
+
+    def apply_server_status(server, state):
+        iid = f"{server[0]}:{server[1]}"
+        srv = servers_by_id.get(iid)
+        if srv is None:
+            return
+        srv["Map"] = state["map"] or srv["Map"]
+        srv["Players"] = q2query.format_players(state)
+        values = (srv["Hostname"], srv["IP"], srv["Game"], srv["Map"], srv["Players"])
+        if row_state[iid][0] != values:
+            server_tree.item(iid, values=values)
+            row_state[iid] = (values, row_state[iid][1])
+
+    poller = q2poller.StatusPoller(on_server_status, history=history)
+    poller.start()
+
+    # Primero se dibuja la última lista guardada y la actual llega después
     update_server_tree(servers)
+    refresh_server_list()
+
+    # Búsqueda de jugadores: responde desde player_index, sin consultar la red
+    search_frame = ttk.Frame(server_frame)
+    search_frame.pack(side="top", fill="x", padx=5, pady=2)
+    ttk.Label(search_frame, text="Buscar jugador:").pack(side="left")
+    search_var = tk.StringVar()
+    search_entry = ttk.Entry(search_frame, textvariable=search_var, width=30)
+    search_entry.pack(side="left", padx=5)
+    search_result = ttk.Label(search_frame, text="")
+    search_result.pack(side="left", fill="x", expand=True)
+    server_tree.tag_configure("player_match", background="#fff3a0")
+
+    def search_players(*args):
+        for iid in server_tree.tag_has("player_match"):
+            server_tree.item(iid, tags=())
+        text = search_var.get().strip()
+        if not text:
+            search_result.config(text="")
+            return
+        found = player_index.search(text)
+        shown = []
+        for name, (ip, port) in found:
+            iid = f"{ip}:{port}"
+            srv = servers_by_id.get(iid)
+            if srv is None:
+                continue
+            if not shown:
+                server_tree.see(iid)
+            server_tree.item(iid, tags=("player_match",))
+            shown.append(f"{name} ({srv['Hostname']})")
+        if shown:
+            more = f" y {len(shown) - 5} más" if len(shown) > 5 else ""
+            search_result.config(text=", ".join(shown[:5]) + more)
+        else:
+            search_result.config(text="Sin resultados")
+    search_var.trace_add("write", search_players)
+
     scrollbar = ttk.Scrollbar(server_frame, orient="vertical", command=server_tree.yview)
     server_tree.configure(yscroll=scrollbar.set)
     scrollbar.pack(side="right", fill="y")
@@ -346,6 +501,50 @@ def create_gui(servers):
     act_frame.pack(padx=10, pady=10, fill="x")
     icon_send = PhotoImage(file="iconos/icons8-lleno-enviado-30.png").subsample(2,2)
     tk.Button(act_frame, text="Enviar 'status'", image=icon_send, compound='left', command=send_command).pack(padx=5, pady=5)
+
+    map_frame = ttk.LabelFrame(tab_acciones, text="Cambiar mapa")
+    map_frame.pack(padx=10, pady=10, fill="x")
+    map_var = tk.StringVar()
+    map_combo = ttk.Combobox(map_frame, textvariable=map_var, width=30)
+    map_combo.pack(side="left", padx=5, pady=5)
+
+    def show_maps(server, maps):
+        # Sólo si sigue seleccionado el mismo servidor
+        if maps is not None and selected_server_admin and \
+                (selected_server_admin["ip"], selected_server_admin["port"]) == server:
+            map_combo["values"] = maps
+
+    def load_maps():
+        map_combo["values"] = ()
+        if not selected_server_admin:
+            return
+        server = (selected_server_admin["ip"], selected_server_admin["port"])
+        def refreshed(maps, error):
+            if error:
+                write_log(f"Error al obtener los mapas de {server[0]}:{server[1]}: {error}")
+            root.after(0, lambda: show_maps(server, maps))
+        show_maps(server, map_cache.get(*server, selected_server_admin["password"], callback=refreshed))
+
+    def change_map():
+        name = map_var.get().strip()
+        if not selected_server_admin:
+            messagebox.showwarning("Advertencia", "Selecciona un servidor con configuración RCON.")
+            return
+        if not name:
+            return
+        server = dict(selected_server_admin)
+        def done(out, error):
+            if error:
+                write_log(f"Error al cambiar el mapa en {server['ip']}:{server['port']}: {error}")
+            else:
+                write_log(f"Mapa cambiado a '{name}' en {server['ip']}:{server['port']}")
+        # Por la misma cola que la consola, para respetar el orden de los comandos del servidor
+        try:
+            console_executor.submit(server["ip"], server["port"], server["password"], f"map {name}",
+                                    callback=done)
+        except q2rcon.RconBusy as e:
+            messagebox.showwarning("Advertencia", f"Servidor ocupado: {e}")
+    tk.Button(map_frame, text="Cambiar mapa", command=change_map).pack(side="left", padx=5, pady=5)
     
     # --- Pestaña Consola ---
     cons_frame = tk.Frame(tab_consola, width=800, height=200, bg="black")
@@ -361,6 +560,28 @@ def create_gui(servers):
     cons_entry = tk.Entry(cons_input, bg="black", fg="lime", insertbackground="white", font=("Courier New", 10))
     cons_entry.bind("<Return>", lambda event: send_console_command())
     cons_entry.pack(side="left", fill="x", expand=True, padx=(0,5))
+
+    # Difusión: enviar el mismo comando a varios servidores de servers.ini a la vez
+    broadcast_var = tk.BooleanVar(value=False)
+    broadcast_targets = set()
+
+    def choose_broadcast_targets():
+        dlg = tk.Toplevel(root)
+        dlg.title("Servidores para la difusión")
+        listbox = tk.Listbox(dlg, selectmode="multiple", width=40, height=12)
+        sections = rcon_config.sections()
+        for i, sec in enumerate(sections):
+            listbox.insert(tk.END, sec)
+            if not broadcast_targets or sec in broadcast_targets:
+                listbox.selection_set(i)
+        listbox.pack(padx=5, pady=5, fill="both", expand=True)
+
+        def save_targets():
+            broadcast_targets.clear()
+            broadcast_targets.update(sections[i] for i in listbox.curselection())
+            broadcast_var.set(bool(broadcast_targets))
+            dlg.destroy()
+        tk.Button(dlg, text="Aceptar", command=save_targets).pack(pady=5)
     
     def append_to_console(text):
         cons_text.config(state=tk.NORMAL)
@@ -368,59 +589,154 @@ def create_gui(servers):
         cons_text.see(tk.END)
         cons_text.config(state=tk.DISABLED)
     
-    def run_console_command(cmd):
+    def run_console_command(cmd, server):
+        # Se encola en el servidor; devuelve False si su cola está llena
+        def done(out, error):
+            if error:
+                root.after(0, lambda: append_to_console(f"Error: {error}"))
+                write_log(f"Consola: error al ejecutar '{cmd}': {error}")
+            else:
+                root.after(0, lambda: append_to_console(out))
+                write_log(f"Consola: comando '{cmd}' ejecutado")
         try:
-            conn = q2rcon.Q2RConnection(
-                host=selected_server_admin["ip"],
-                port=selected_server_admin["port"],
-                password=selected_server_admin["password"]
-            )
-            out = conn.send(cmd)
-            root.after(0, lambda: append_to_console(out))
-            write_log(f"Consola: comando '{cmd}' ejecutado")
-        except Exception as e:
-            root.after(0, lambda: append_to_console(f"Error: {e}"))
-            write_log(f"Consola: error al ejecutar '{cmd}': {e}")
-    
+            console_executor.submit(server["ip"], server["port"], server["password"], cmd, callback=done)
+        except q2rcon.RconBusy:
+            append_to_console(f"Servidor ocupado: ya hay {console_executor.max_pending} comandos en cola, "
+                              f"no se envió '{cmd}'")
+            return False
+        return True
+
+    def run_broadcast_command(cmd, targets):
+        # Cada resultado y el resumen final se muestran desde el hilo de Tk
+        def show_result(server, out, error):
+            append_to_console(f"[{server[0]}:{server[1]}] " + (f"Error: {error}" if error else out.rstrip("\n")))
+
+        def show_summary(summary):
+            append_to_console(f"Difusión terminada: {summary['ok']} correctos, {summary['failed']} con error")
+            write_log(f"Consola: comando '{cmd}' difundido a {len(targets)} servidores "
+                      f"({summary['failed']} con error)")
+
+        future = console_executor.broadcast(
+            targets, cmd, callback=lambda server, out, error: root.after(0, lambda: show_result(server, out, error)))
+        future.add_done_callback(lambda f: root.after(0, lambda: show_summary(f.result())))
+
+    def cancel_console_commands():
+        if not selected_server_admin:
+            return
+        count = console_executor.cancel(selected_server_admin["ip"], selected_server_admin["port"])
+        append_to_console(f"Cancelados {count} comandos en cola")
+
     def send_console_command():
         cmd = cons_entry.get().strip()
         if not cmd:
             return
+        if broadcast_var.get():
+            targets = []
+            for sec in rcon_config.sections():
+                if broadcast_targets and sec not in broadcast_targets:
+                    continue
+                try:
+                    ip, port = sec.split(":")
+                    targets.append((ip, int(port), rcon_config[sec].get("rcon_password", "")))
+                except ValueError:
+                    continue
+            if not targets:
+                messagebox.showwarning("Advertencia", "No hay servidores RCON configurados para la difusión.")
+                return
+            append_to_console(f"> {cmd}  (difusión a {len(targets)} servidores)")
+            cons_entry.delete(0, tk.END)
+            run_broadcast_command(cmd, targets)
+            return
         if not selected_server_admin:
             messagebox.showwarning("Advertencia", "No hay datos RCON configurados para el servidor seleccionado.")
             return
         append_to_console(f"> {cmd}")
-        cons_entry.delete(0, tk.END)
-        threading.Thread(target=run_console_command, args=(cmd,)).start()
+        # Con la cola llena el comando queda en la entrada para reintentarlo
+        if run_console_command(cmd, dict(selected_server_admin)):
+            cons_entry.delete(0, tk.END)
     
     tk.Button(cons_input, text="Enviar", command=send_console_command, bg="black", fg="lime", font=("Courier New", 10)).pack(side="left")
+    tk.Checkbutton(cons_input, text="Difundir", variable=broadcast_var, bg="black", fg="lime",
+                   selectcolor="black", font=("Courier New", 10)).pack(side="left", padx=(5,0))
+    tk.Button(cons_input, text="Servidores...", command=choose_broadcast_targets, bg="black", fg="lime",
+              font=("Courier New", 10)).pack(side="left", padx=(5,0))
+    tk.Button(cons_input, text="Cancelar cola", command=cancel_console_commands, bg="black", fg="lime",
+              font=("Courier New", 10)).pack(side="left", padx=(5,0))
     
     # --- Pestaña Logs ---
     log_frame = tk.Frame(tab_logs, bg="#333")
     log_frame.pack(expand=True, fill="both", padx=5, pady=5)
     log_text = tk.Text(log_frame, bg="#333", fg="white", font=("Arial", 10), wrap="word")
+    log_scroll = ttk.Scrollbar(log_frame, orient="vertical", command=log_text.yview)
+    log_scroll.pack(side="right", fill="y")
     log_text.pack(expand=True, fill="both", padx=5, pady=5)
-    tk.Button(tab_logs, text="Limpiar Logs", command=lambda: log_text.delete("1.0", tk.END)).pack(pady=5)
+
+    # Sólo se muestran las últimas líneas de logs.txt; las anteriores se cargan
+    # por páginas al llegar arriba del todo con el scroll
+    log_view = q2log.LogFileView(LOG_FILE)
+
+    # Sólo se agenda una carga a la vez aunque lleguen varios eventos de scroll
+    log_paging = {"pending": False}
+
+    def load_older_logs():
+        log_paging["pending"] = False
+        if log_text.yview()[0] > 0.0:
+            # Se movió la vista antes de que se ejecutara la carga
+            return
+        text = log_view.older(LOG_PAGE_LINES)
+        if text:
+            # Mantener a la vista la línea que estaba arriba antes de insertar
+            lines = text.count("\n")
+            log_text.insert("1.0", text)
+            log_text.yview(f"{lines + 1}.0")
+
+    def on_log_scroll(first, last):
+        log_scroll.set(first, last)
+        if float(first) <= 0.0 and not log_paging["pending"]:
+            log_paging["pending"] = True
+            root.after_idle(load_older_logs)
+
+    log_text.configure(yscrollcommand=on_log_scroll)
+
+    def clear_logs():
+        log_text.delete("1.0", tk.END)
+        log_view.skip_history()
+
+    tk.Button(tab_logs, text="Limpiar Logs", command=clear_logs).pack(pady=5)
     
-    # Asignar el widget de logs a la variable global para usarlo en write_log
-    global log_text_widget
-    log_text_widget = log_text
-    # Cargar contenido previo de logs.txt, si existe
-    if os.path.exists(LOG_FILE):
-        try:
-            with open(LOG_FILE, "r") as f:
-                content = f.read()
-            log_text.insert(tk.END, content)
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudieron cargar los logs: {e}")
+    # Las líneas nuevas llegan desde el hilo de escritura: se acumulan y se muestran
+    # en el hilo de Tk con un único after() por tanda
+    pending_log = []
+    pending_log_lock = threading.Lock()
+
+    def on_log_lines(lines):
+        with pending_log_lock:
+            schedule = not pending_log
+            pending_log.extend(lines)
+        if schedule:
+            root.after(0, show_log_lines)
+
+    def show_log_lines():
+        with pending_log_lock:
+            text = "".join(pending_log)
+            pending_log.clear()
+        log_text.insert(tk.END, text)
+        log_text.see(tk.END)
+
+    # Cargar las últimas líneas de logs.txt, si existe
+    try:
+        log_text.insert(tk.END, log_view.tail(LOG_PAGE_LINES))
+        log_text.see(tk.END)
+    except Exception as e:
+        messagebox.showerror("Error", f"No se pudieron cargar los logs: {e}")
+    log_writer.add_listener(on_log_lines)
     
     # --- Eventos en el Treeview de Servidores ---
     def on_select(event):
         global selected_server_admin
         sel = server_tree.selection()
         if sel:
-            idx = int(sel[0])
-            srv = servers[idx]
+            srv = servers_by_id[sel[0]]
             q2query.update_players(srv, player_tree)
             try:
                 ip, port = q2query.parse_quake2_url(srv["IP"])
@@ -431,6 +747,7 @@ def create_gui(servers):
                     selected_server_admin = None
             except Exception:
                 selected_server_admin = None
+            load_maps()
             write_log(f"Seleccionado servidor: {srv['Hostname']} ({srv['IP']})")
     
     server_tree.bind("<<TreeviewSelect>>", on_select)
@@ -438,8 +755,7 @@ def create_gui(servers):
     def on_double_click(event):
         sel = server_tree.selection()
         if sel:
-            idx = int(sel[0])
-            srv = servers[idx]
+            srv = servers_by_id[sel[0]]
             try:
                 ip, port = q2query.parse_quake2_url(srv["IP"])
             except Exception as e:
@@ -458,8 +774,7 @@ def create_gui(servers):
     def copy_selected_server_info(event):
         sel = server_tree.selection()
         if sel:
-            idx = int(sel[0])
-            srv = servers[idx]
+            srv = servers_by_id[sel[0]]
             info = f"{srv['Hostname']} - {srv['IP']}"
             root.clipboard_clear()
             root.clipboard_append(info)
@@ -469,9 +784,18 @@ def create_gui(servers):
     server_tree.bind("<Double-1>", on_double_click)
     
     root.mainloop()
+    poller.stop()
+    q2query.save_server_snapshot(servers)
+    console_executor.shutdown(wait=False)
+    rcon_pool.close()
+    map_cache.save()
+    history.save()
+    q2rtt.rtt_table.save()
+    log_writer.close()
 
 if __name__ == "__main__":
-    server_list = q2query.get_server_data()
+    # Se arranca con la lista de la sesión anterior; la actual se obtiene ya con la ventana abierta
+    server_list = q2query.load_server_snapshot()
     # apply_dark_mode_styles()
     create_gui(server_list)
 
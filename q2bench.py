@@ -0,0 +1,282 @@
+#################################################################
+# Benchmarks de rendimiento de q2query / q2rcon                 #
+#################################################################
+import argparse
+import json
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+
+import q2fake
+import q2query
+import q2rcon
+from q2trace import tracer
+
+###############################################################
+# Respuestas de ejemplo (formato real de un servidor dday)     #
+###############################################################
+
+SAMPLE_INFO = ("\\mapname\\dday5\\gamename\\dday\\maxclients\\32\\hostname\\D-Day Chile Publico I"
+               "\\version\\R1Q2 b8000 i386 Jan 1 2024 Linux\\dmflags\\16\\fraglimit\\0"
+               "\\timelimit\\0\\cheats\\0\\protocol\\34\\sv_uptime\\3d 4h\\gamedir\\dday")
+
+def sample_status_packet(players=32):
+    """Paquete de respuesta a 'status' con la cantidad de jugadores indicada."""
+    lines = [SAMPLE_INFO]
+    for i in range(players):
+        # Algunos bots (ping 0) y nombres con espacios y caracteres altos, como en la práctica
+        ping = 0 if i % 8 == 7 else 40 + i * 3
+        lines.append(f'{i * 7 - 5} {ping} "[DDAY] Jugador \xe9{i:02d}" "190.{i}.12.{100 + i}:27901"')
+    body = "\n".join(lines) + "\n"
+    return b"\xff\xff\xff\xffprint\n" + body.encode("latin1")
+
+###############################################################
+# Parser anterior, como referencia para medir la mejora        #
+###############################################################
+
+def legacy_parse_line_args(line):
+    args = []
+    in_quote = False
+    current = ""
+    i = 0
+    while i < len(line):
+        c = line[i]
+        if c == '"':
+            in_quote = not in_quote
+            if not in_quote and current:
+                args.append(current)
+                current = ""
+            i += 1
+            continue
+        if c.isspace() and not in_quote:
+            if current:
+                args.append(current)
+                current = ""
+            i += 1
+        else:
+            current += c
+            i += 1
+    if current:
+        args.append(current)
+    return args
+
+def legacy_parse_players(lines):
+    players = []
+    for line in lines:
+        line = line.strip()
+        if not line or line[0] == '\0':
+            break
+        args = legacy_parse_line_args(line)
+        if not args:
+            continue
+        player = {}
+        try:
+            player["frags"] = int(args[0])
+        except:
+            player["frags"] = 0
+        try:
+            player["ping"] = int(args[1])
+        except:
+            player["ping"] = 0
+        player["name"] = args[2] if len(args) > 2 and args[2] else ""
+        if not player["name"]:
+            player.pop("name", None)
+        player["address"] = args[3] if len(args) > 3 and args[3] else ""
+        if not player["address"]:
+            player.pop("address", None)
+        players.append(player)
+    return players
+
+def legacy_parse_response(data):
+    lines = data[4:].decode("latin1", errors="replace").split(None, 1)[1].splitlines()
+    raw = {}
+    info_parts = lines[0].split('\\')[1:]
+    for i in range(0, len(info_parts) - 1, 2):
+        raw[info_parts[i]] = info_parts[i + 1]
+    players = legacy_parse_players(lines[1:])
+    # Mismo diccionario que devolvía Quake2Query.query antes de q2model
+    return {
+        "raw": raw,
+        "players": [p for p in players if p.get("ping", 0)],
+        "bots": [p for p in players if not p.get("ping", 0)],
+        "password": raw.get("g_needpass"),
+        "map": raw.get("mapname"),
+        "maxplayers": raw.get("maxclients"),
+        "name": raw.get("hostname"),
+        "numplayers": 0,
+        "version": raw.get("version")
+    }
+
+###############################################################
+# Microbenchmark del parser de jugadores                       #
+###############################################################
+
+def _best(func, number, repeat=5):
+    """Mejor tiempo por llamada (en microsegundos) de varias repeticiones."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+def bench_parser(players=32, number=2000):
+    packet = sample_status_packet(players)
+    lines = packet[10:].decode("latin1").splitlines()[1:]
+    query = q2query.Quake2Query()
+
+    # Ambos parsers deben entregar exactamente lo mismo
+    for line in lines:
+        assert legacy_parse_line_args(line) == query.parse_line_args(line)
+
+    results = []
+    old = _best(lambda: [legacy_parse_line_args(line) for line in lines], number)
+    new = _best(lambda: [query.parse_line_args(line) for line in lines], number)
+    results.append(("parse_line_args x%d" % len(lines), old, new))
+    old = _best(lambda: legacy_parse_response(packet), number)
+    new = _best(lambda: query.parse_response(packet), number)
+    results.append(("parse_response (%d jugadores)" % players, old, new))
+    return results
+
+###############################################################
+# Memoria de una instantánea de toda la flota                  #
+###############################################################
+
+def _snapshot_size(parse, packets):
+    """Bytes que quedan reservados al conservar el resultado de parsear todos los paquetes."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    states = [parse(packet) for packet in packets]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del states
+    return size
+
+def bench_memory(servers=500, players=16):
+    """Compara el tamaño de una instantánea de la flota: diccionarios contra q2model."""
+    query = q2query.Quake2Query()
+    packets = [sample_status_packet(players).replace(b"Publico I", b"Publico %d" % i)
+               for i in range(servers)]
+    old = _snapshot_size(legacy_parse_response, packets)
+    new = _snapshot_size(query.parse_response, packets)
+    return [("instantánea %d servidores (KiB)" % servers, old / 1024, new / 1024)]
+
+def print_results(results):
+    print(f"{'prueba':40} {'antes (us)':>12} {'ahora (us)':>12} {'mejora':>8}")
+    for name, old, new in results:
+        print(f"{name:40} {old:12.1f} {new:12.1f} {old / new:7.1f}x")
+
+
+###############################################################
+# Latencia y rendimiento contra servidores falsos locales      #
+###############################################################
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def _measure(name, func, samples, items=1):
+    """Ejecuta func samples veces; devuelve (nombre, p50 ms, p99 ms, consultas/s, errores)."""
+    times = []
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(samples):
+        t = time.perf_counter()
+        try:
+            func()
+        except Exception:
+            errors += 1
+            continue
+        times.append(time.perf_counter() - t)
+    total = time.perf_counter() - start
+    if not times:
+        return (name, float("nan"), float("nan"), 0.0, errors)
+    return (name, _percentile(times, 50) * 1000, _percentile(times, 99) * 1000,
+            samples * items / total, errors)
+
+def bench_network(samples=200, latency=0.0, loss=0.0, players=16, fleet=100, long_samples=3,
+                  packet_size=1384):
+    """Mide las consultas de status y los comandos rcon contra servidores falsos."""
+    results = []
+
+    def factory():
+        return q2fake.FakeQuake2Server(players=players, latency=latency, loss=loss,
+                                       packet_size=packet_size)
+
+    with q2fake.FakeServerThread(factory) as server:
+        ip, port = server.address
+        query = q2query.Quake2Query()
+        results.append(_measure("Quake2Query.query", lambda: query.query(ip, port, timeout=1.0), samples))
+        conn = q2rcon.Q2RConnection(ip, port, "secret")
+        results.append(_measure("RConnection.send('status')", lambda: conn.send("status"), samples))
+        results.append(_measure("Q2RConnection.get_status", conn.get_status, samples))
+        results.append(_measure("Q2RConnection.get_serverinfo", conn.get_serverinfo, samples))
+        results.append(_measure("Q2RConnection.get_map_list", conn.get_map_list, long_samples))
+
+    with q2fake.FakeServerThread(factory, count=fleet) as servers:
+        addresses = servers.addresses
+        sweeps = max(samples // 20, 1)
+        results.append(_measure(f"query_all ({fleet} servidores)",
+                                lambda: q2query.query_all(addresses, timeout=1.0), sweeps, items=fleet))
+    return results
+
+def print_network_results(results):
+    print(f"{'prueba':40} {'p50 (ms)':>10} {'p99 (ms)':>10} {'consultas/s':>12} {'errores':>8}")
+    for name, p50, p99, qps, errors in results:
+        print(f"{name:40} {p50:10.2f} {p99:10.2f} {qps:12.1f} {errors:8d}")
+
+###############################################################
+# Tiempo de arranque en frío de la línea de comandos          #
+###############################################################
+
+# Módulos que una consulta desde q2cli no debería cargar
+HEAVY_MODULES = ("tkinter", "requests", "bs4", "asyncio", "concurrent.futures")
+
+def bench_startup(samples=10):
+    """Mide el arranque de intérpretes nuevos: 'import q2cli' y 'q2cli --help'."""
+    results = []
+    commands = [
+        ("python -c pass", [sys.executable, "-c", "pass"]),
+        ("import q2query", [sys.executable, "-c", "import q2query"]),
+        ("import q2cli", [sys.executable, "-c", "import q2cli"]),
+        ("q2cli --help", [sys.executable, "-m", "q2cli", "--help"]),
+    ]
+    for name, command in commands:
+        results.append(_measure(name, lambda: subprocess.run(command, check=True,
+                                                             stdout=subprocess.DEVNULL), samples))
+    # Qué módulos pesados quedaron cargados tras importar q2cli
+    probe = ("import sys, json, q2cli; print(json.dumps([m for m in %r if m in sys.modules]))"
+             % (HEAVY_MODULES,))
+    loaded = json.loads(subprocess.run([sys.executable, "-c", probe], check=True,
+                                       capture_output=True, text=True).stdout)
+    return results, loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de q2query y q2rcon")
+    parser.add_argument("suite", nargs="?", choices=("parser", "red", "inicio"), default="parser",
+                        help="parser: parser y memoria; red: latencia contra servidores falsos; "
+                             "inicio: arranque en frío de q2cli")
+    parser.add_argument("--players", type=int, default=32)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="latencia simulada en segundos")
+    parser.add_argument("--loss", type=float, default=0.0, help="probabilidad de perder un paquete")
+    parser.add_argument("--fleet", type=int, default=100, help="servidores en el barrido de la flota")
+    parser.add_argument("--trace", metavar="ARCHIVO",
+                        help="red: guarda una traza de Chrome por fase y muestra el resumen")
+    parser.add_argument("--packet-size", type=int, default=1384,
+                        help="bytes de salida rcon por paquete (menos = más paquetes por respuesta)")
+    args = parser.parse_args()
+    if args.suite == "red":
+        if args.trace:
+            tracer.enable()
+        print_network_results(bench_network(args.samples, args.latency, args.loss, args.players,
+                                            args.fleet, packet_size=args.packet_size))
+        if args.trace:
+            tracer.export_chrome(args.trace)
+            print(f"\n{'fase':40} {'veces':>10} {'total (ms)':>12} {'máx (ms)':>10}")
+            for name, (count, total, longest) in sorted(tracer.summary().items()):
+                print(f"{name:40} {count:10d} {total * 1000:12.1f} {longest * 1000:10.2f}")
+    elif args.suite == "inicio":
+        results, loaded = bench_startup(max(args.samples // 20, 5))
+        print_network_results(results)
+        print("módulos pesados cargados por q2cli:", ", ".join(loaded) or "ninguno")
+    else:
+        print_results(bench_parser(args.players) + bench_memory(players=args.players))
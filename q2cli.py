@@ -0,0 +1,192 @@
+#################################################################
+# Línea de comandos sin interfaz gráfica                        #
+#################################################################
+# Uso:
+#   python -m q2cli query 1.2.3.4:27910 [5.6.7.8:27910 ...]
+#   python -m q2cli rcon 1.2.3.4:27910 status [--password clave]
+#   python -m q2cli list [--game dday] [--master host:puerto] [--web]
+#   python -m q2cli [--metrics-port 9108] watch 1.2.3.4:27910 ... [--history history.q2h]
+# La salida es JSON (una línea por resultado en watch); los mensajes de los
+# módulos van a stderr. No importa tkinter y sólo carga requests si hace
+# falta recurrir a la página web.
+import argparse
+import contextlib
+import json
+import os
+import sys
+
+import q2query
+
+CONFIG_FILE = "servers.ini"
+
+# Salida JSON; mientras corre un comando sys.stdout apunta a stderr
+_out = sys.stdout
+
+
+def _address(text):
+    try:
+        return q2query.parse_quake2_url(text.strip())
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"{text}: {e}")
+
+def _print(data, pretty):
+    print(json.dumps(data, ensure_ascii=False, indent=2 if pretty else None), file=_out)
+    _out.flush()
+
+def _rcon_password(ip, port, password):
+    """Clave dada, la variable Q2_RCON_PASSWORD o la de servers.ini (como la interfaz)."""
+    if password is not None:
+        return password
+    if os.environ.get("Q2_RCON_PASSWORD"):
+        return os.environ["Q2_RCON_PASSWORD"]
+    import configparser
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE)
+    section = f"{ip}:{port}"
+    return config[section].get("rcon_password", "") if section in config else None
+
+
+def cmd_query(args):
+    failed = False
+    results = []
+    if len(args.servers) == 1:
+        ip, port = args.servers[0]
+        try:
+            state = q2query.Quake2Query().query(ip, port, timeout=args.timeout)
+            results.append({"server": f"{ip}:{port}", "status": state.to_dict()})
+        except Exception as e:
+            failed = True
+            results.append({"server": f"{ip}:{port}", "error": str(e)})
+    else:
+        def collect(server, state, error):
+            nonlocal failed
+            entry = {"server": f"{server[0]}:{server[1]}"}
+            if error is None:
+                entry["status"] = state.to_dict()
+            else:
+                failed = True
+                entry["error"] = str(error)
+            results.append(entry)
+        q2query.query_all(args.servers, timeout=args.timeout, callback=collect)
+    _print(results[0] if len(results) == 1 else results, args.pretty)
+    return 1 if failed else 0
+
+def cmd_rcon(args):
+    import q2rcon
+    ip, port = args.server
+    command = " ".join(args.command)
+    password = _rcon_password(ip, port, args.password)
+    if password is None:
+        _print({"server": f"{ip}:{port}", "error": "Falta la clave RCON (--password)"}, args.pretty)
+        return 2
+    try:
+        conn = q2rcon.Q2RConnection(ip, port, password)
+        response = conn.send(command)
+        if isinstance(response, q2rcon.RconError):
+            raise response
+    except Exception as e:
+        _print({"server": f"{ip}:{port}", "command": command, "error": str(e)}, args.pretty)
+        return 1
+    if args.raw:
+        _out.write(response)
+    else:
+        _print({"server": f"{ip}:{port}", "command": command, "response": response}, args.pretty)
+    return 0
+
+def cmd_list(args):
+    try:
+        if args.web:
+            servers = q2query.get_server_data_html()
+        else:
+            servers = q2query.get_server_data(game=args.game, masters=args.master or None)
+    except Exception as e:
+        _print({"error": str(e)}, args.pretty)
+        return 1
+    _print(servers, args.pretty)
+    return 0 if servers else 1
+
+def cmd_watch(args):
+    import signal
+    import threading
+    import q2poller
+
+    def changed(server, state):
+        _print({"server": f"{server[0]}:{server[1]}", "status": state.to_dict()}, False)
+
+    history = None
+    if args.history:
+        import q2history
+        history = q2history.MetricsStore(args.history)
+        history.load()
+    poller = q2poller.StatusPoller(changed, busy_interval=args.interval, history=history)
+    poller.set_servers(args.servers)
+    poller.start()
+    # Como demonio se detiene con SIGTERM: se sale por el finally para guardar el historial
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        poller.stop()
+        if history is not None:
+            history.save()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="q2cli", description="Consultas a servidores de Quake II sin interfaz")
+    parser.add_argument("--pretty", action="store_true", help="JSON indentado")
+    parser.add_argument("--trace", metavar="ARCHIVO",
+                        help="guarda las fases de cada consulta como traza de Chrome (JSON)")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="publica métricas en http://127.0.0.1:PUERTO/metrics (útil con watch)")
+    sub = parser.add_subparsers(dest="command_name", required=True)
+
+    p = sub.add_parser("query", help="'status' de uno o más servidores")
+    p.add_argument("servers", nargs="+", type=_address, metavar="ip:puerto")
+    p.add_argument("--timeout", type=float, default=None,
+                   help="segundos de espera (por defecto según el RTT medido)")
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser("rcon", help="ejecuta un comando RCON")
+    p.add_argument("server", type=_address, metavar="ip:puerto")
+    p.add_argument("command", nargs="+")
+    p.add_argument("--password", help=f"clave RCON (por defecto Q2_RCON_PASSWORD o {CONFIG_FILE})")
+    p.add_argument("--raw", action="store_true", help="imprime la respuesta tal cual, sin JSON")
+    p.set_defaults(func=cmd_rcon)
+
+    p = sub.add_parser("list", help="lista de servidores del juego")
+    p.add_argument("--game", default=q2query.GAME)
+    p.add_argument("--master", action="append", type=_address, metavar="host:puerto",
+                   help="servidor maestro (se puede repetir)")
+    p.add_argument("--web", action="store_true", help="usar sólo la página de q2servers.com")
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("watch", help="sondea servidores e imprime cada cambio")
+    p.add_argument("servers", nargs="+", type=_address, metavar="ip:puerto")
+    p.add_argument("--interval", type=float, default=5.0, help="segundos entre consultas")
+    p.add_argument("--history", help="archivo de historial (q2history) a alimentar")
+    p.set_defaults(func=cmd_watch)
+    return parser
+
+def main(argv=None):
+    global _out
+    args = build_parser().parse_args(argv)
+    _out = sys.stdout
+    if args.metrics_port:
+        from q2metrics import metrics
+        metrics.serve(args.metrics_port)
+    if args.trace:
+        from q2trace import tracer
+        tracer.enable()
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            return args.func(args)
+    finally:
+        if args.trace:
+            tracer.export_chrome(args.trace)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+#################################################################
+# Servidores falsos de Quake II para pruebas locales            #
+#################################################################
+import asyncio
+import random
+import socket
+import sys
+import threading
+
+import q2rcon
+
+###############################################################
+# Servidor maestro falso                                       #
+###############################################################
+
+class FakeMasterServer(asyncio.DatagramProtocol):
+    """Responde a 'query' con la lista binaria de servidores, como un maestro de Quake II."""
+    def __init__(self, servers, per_packet=200):
+        self.servers = list(servers)
+        self.per_packet = per_packet
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if data.rstrip(b"\n\x00") != b"query":
+            return
+        for packet in encode_master_response(self.servers, self.per_packet):
+            self.transport.sendto(packet, addr)
+
+
+def encode_master_response(servers, per_packet=200):
+    """Codifica [(ip, port), ...] en uno o más paquetes 'servers'."""
+    packets = []
+    for i in range(0, max(len(servers), 1), per_packet):
+        body = b"".join(socket.inet_aton(ip) + int(port).to_bytes(2, "big")
+                        for ip, port in servers[i:i + per_packet])
+        packets.append(b"\xff\xff\xff\xffservers " + body)
+    return packets
+
+###############################################################
+# Servidor de juego falso (status y rcon)                      #
+###############################################################
+
+class FakeQuake2Server(asyncio.DatagramProtocol):
+    """
+    Servidor de Quake II simulado: responde a 'status' y a los comandos rcon
+    status, serverinfo, dir maps/, map y echo. Permite simular latencia,
+    pérdida de paquetes y respuestas repartidas en varios paquetes.
+    """
+    def __init__(self, hostname="Servidor falso", map_name="dday1", players=8, maxclients=16,
+                 rcon_password="secret", latency=0.0, loss=0.0, packet_size=1384, maps=None,
+                 game="dday"):
+        self.hostname = hostname
+        self.map_name = map_name
+        self.players = players
+        self.maxclients = maxclients
+        self.rcon_password = rcon_password
+        self.latency = latency
+        self.loss = loss
+        self.packet_size = packet_size
+        self.maps = maps if maps is not None else [f"dday{i}" for i in range(1, 31)]
+        self.game = game
+        self.received = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        if self.loss and random.random() < self.loss:
+            return
+        if not data.startswith(b"\xff\xff\xff\xff"):
+            return
+        text = data[4:].rstrip(b"\x00\n").decode("latin1")
+        if text == "status":
+            packets = [b"\xff\xff\xff\xffprint\n" + self.status_text().encode("latin1")]
+        elif text.startswith("rcon "):
+            packets = self.print_packets(self.rcon(text[5:]))
+        else:
+            return
+        for packet in packets:
+            if self.loss and random.random() < self.loss:
+                continue
+            if self.latency:
+                asyncio.get_running_loop().call_later(self.latency, self.transport.sendto, packet, addr)
+            else:
+                self.transport.sendto(packet, addr)
+
+    def player_list(self):
+        return [(i, i * 3 - 2, 0 if i % 8 == 7 else 30 + i * 5, f"Jugador {i:02d}", f"10.0.{i}.1:27901")
+                for i in range(self.players)]
+
+    def status_text(self):
+        info = (f"\\mapname\\{self.map_name}\\gamename\\{self.game}\\maxclients\\{self.maxclients}"
+                f"\\hostname\\{self.hostname}\\version\\q2fake 1.0")
+        lines = [info] + [f'{frags} {ping} "{name}" "{address}"'
+                          for _, frags, ping, name, address in self.player_list()]
+        return "\n".join(lines) + "\n"
+
+    def rcon(self, text):
+        """Ejecuta un comando rcon y devuelve el texto de salida."""
+        password, _, command = text.partition(" ")
+        if password != self.rcon_password:
+            return "Bad rcon_password.\n"
+        name, _, args = command.partition(" ")
+        if command == "status":
+            lines = [f"map              : {self.map_name}",
+                     "num score ping name            lastmsg address               rate_pps ver",
+                     q2rcon.REPORT_LINE]
+            for num, frags, ping, name, address in self.player_list():
+                lines.append(f"{num:3d} {frags:5d} {ping:4d} {name:15.15s} {0:7d} {address:21.21s} {'15/20':8s} {34:3d}")
+            return "\n".join(lines) + "\n\n"
+        if command == "serverinfo":
+            info = {"mapname": self.map_name, "gamename": self.game, "maxclients": self.maxclients,
+                    "hostname": self.hostname.replace(" ", "_"), "version": "q2fake"}
+            return "Server info settings:\n" + "".join(f"{k:<16}{v}\n" for k, v in info.items())
+        if command == "dir maps/":
+            return "Directory of maps/\n----\n" + "".join(f"{m}.bsp\n" for m in self.maps)
+        if name == "map" and args:
+            self.map_name = args.strip()
+            return f"Loading map {self.map_name}\n"
+        if name == "echo":
+            return args + "\n"
+        return f"Unknown command \"{name}\"\n"
+
+    def print_packets(self, output):
+        """Divide la salida en paquetes 'print' como la redirección del servidor."""
+        data = output.encode("latin1")
+        return [b"\xff\xff\xff\xffprint\n" + data[i:i + self.packet_size]
+                for i in range(0, max(len(data), 1), self.packet_size)]
+
+###############################################################
+# Utilidades para levantar los servidores en un hilo aparte    #
+###############################################################
+
+class FakeServerThread:
+    """
+    Ejecuta uno o más protocolos UDP (count copias) en un event loop propio
+    dentro de un hilo. address/protocol corresponden al primero.
+    """
+    def __init__(self, protocol_factory, host="127.0.0.1", port=0, count=1):
+        self.protocol_factory = protocol_factory
+        self.host = host
+        self.port = port
+        self.count = count
+        self.addresses = []
+        self.protocols = []
+        self._loop = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def address(self):
+        return self.addresses[0] if self.addresses else None
+
+    @property
+    def protocol(self):
+        return self.protocols[0] if self.protocols else None
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        transports = []
+        for i in range(self.count):
+            port = self.port + i if self.port else 0
+            transport, protocol = self._loop.run_until_complete(
+                self._loop.create_datagram_endpoint(self.protocol_factory, local_addr=(self.host, port)))
+            transports.append(transport)
+            self.protocols.append(protocol)
+            self.addresses.append(transport.get_extra_info("sockname")[:2])
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            for transport in transports:
+                transport.close()
+            self._loop.close()
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        return self.address
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+
+if __name__ == "__main__":
+    # Uso: python q2fake.py master [puerto] ip:puerto ip:puerto ...
+    #      python q2fake.py server [puerto] [jugadores] [latencia] [pérdida]
+    mode = sys.argv[1] if len(sys.argv) > 1 else "server"
+    args = sys.argv[2:]
+    if mode == "master":
+        port = int(args[0]) if args else 27900
+        listed = [(a.split(":")[0], int(a.split(":")[1])) for a in args[1:]]
+        server = FakeServerThread(lambda: FakeMasterServer(listed), "0.0.0.0", port)
+    else:
+        port = int(args[0]) if args else 27910
+        players = int(args[1]) if len(args) > 1 else 8
+        latency = float(args[2]) if len(args) > 2 else 0.0
+        loss = float(args[3]) if len(args) > 3 else 0.0
+        server = FakeServerThread(
+            lambda: FakeQuake2Server(players=players, latency=latency, loss=loss), "0.0.0.0", port)
+    print("Servidor falso escuchando en", server.start())
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,266 @@
+#################################################################
+# Historial compacto de jugadores, ping y RTT por servidor      #
+#################################################################
+# Cada servidor guarda sus muestras en buffers circulares de
+# array.array (unos pocos bytes por muestra, sin objetos por punto),
+# en tres resoluciones: muestras crudas, promedios por minuto y por
+# hora. La memoria queda acotada por las capacidades de cada nivel
+# sin importar cuánto tiempo esté abierta la aplicación.
+import json
+import os
+import sys
+import threading
+import time
+from array import array
+
+# Columnas de cada muestra: hora (epoch), jugadores, ping promedio, ping máximo y RTT (ms)
+COLUMNS = ("time", "players", "ping_avg", "ping_max", "rtt")
+_TYPECODES = ("d", "f", "f", "f", "f")
+# Al agregar un intervalo, ping_max conserva el máximo y el resto se promedia
+_MAX_COLUMNS = ("ping_max",)
+
+# (segundos por punto, capacidad): 1 h de muestras a 5 s, 2 días por minuto, 60 días por hora
+LEVELS = ((0, 720), (60, 2880), (3600, 1440))
+
+_MAGIC = b"Q2H1"
+
+
+class _Ring:
+    """Buffer circular por columnas; las filas quedan ordenadas por hora."""
+    __slots__ = ("capacity", "columns", "start", "count")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.columns = [array(code, bytes(array(code).itemsize * capacity)) for code in _TYPECODES]
+        self.start = 0
+        self.count = 0
+
+    def append(self, row):
+        i = (self.start + self.count) % self.capacity
+        for column, value in zip(self.columns, row):
+            column[i] = value
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def _time(self, n):
+        return self.columns[0][(self.start + n) % self.capacity]
+
+    def _bisect(self, t):
+        """Primera fila (en orden lógico) con hora >= t."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._time(mid) < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def oldest(self):
+        return self._time(0) if self.count else None
+
+    def range(self, start, end):
+        """Columnas (listas) con las filas cuya hora está en [start, end]."""
+        first, last = self._bisect(start), self._bisect(end + 1e-9)
+        result = []
+        for column in self.columns:
+            a, b = (self.start + first) % self.capacity, (self.start + last) % self.capacity
+            if last - first == 0:
+                result.append([])
+            elif a < b:
+                result.append(column[a:b].tolist())
+            else:
+                result.append(column[a:].tolist() + column[:b].tolist())
+        return result
+
+    def ordered(self):
+        """Columnas completas en orden cronológico (para guardarlas en disco)."""
+        end = self.start + self.count
+        if end <= self.capacity:
+            return [column[self.start:end] for column in self.columns]
+        end -= self.capacity
+        return [column[self.start:] + column[:end] for column in self.columns]
+
+
+class _Bucket:
+    """Acumula las filas de un intervalo para el nivel siguiente."""
+    __slots__ = ("start", "n", "sums", "maxes")
+
+    def __init__(self, start):
+        self.start = start
+        self.n = 0
+        self.sums = [0.0] * (len(COLUMNS) - 1)
+        self.maxes = [0.0] * (len(COLUMNS) - 1)
+
+    def add(self, row):
+        self.n += 1
+        for i, value in enumerate(row[1:]):
+            self.sums[i] += value
+            if value > self.maxes[i]:
+                self.maxes[i] = value
+
+    def row(self):
+        values = [m if name in _MAX_COLUMNS else s / self.n
+                  for name, s, m in zip(COLUMNS[1:], self.sums, self.maxes)]
+        return [self.start] + values
+
+
+class ServerHistory:
+    """Las tres resoluciones de un servidor."""
+    def __init__(self, levels=LEVELS):
+        self.levels = [(step, _Ring(capacity)) for step, capacity in levels]
+        self._buckets = [None] * len(self.levels)
+
+    def add(self, row):
+        self.levels[0][1].append(row)
+        self._carry(1, row)
+
+    def _carry(self, level, row):
+        """Pasa la fila al acumulador del nivel; al cerrar un intervalo lo baja al siguiente."""
+        if level >= len(self.levels):
+            return
+        step = self.levels[level][0]
+        start = row[0] - row[0] % step
+        bucket = self._buckets[level]
+        if bucket is not None and bucket.start != start:
+            closed = bucket.row()
+            self.levels[level][1].append(closed)
+            self._carry(level + 1, closed)
+            bucket = None
+        if bucket is None:
+            bucket = self._buckets[level] = _Bucket(start)
+        bucket.add(row)
+
+    def query(self, start, end, step=None):
+        """
+        Devuelve (segundos por punto, {columna: valores}) entre start y end. Sin step se usa
+        el nivel más fino que todavía cubre start, así un gráfico de un mes no recorre
+        muestras crudas y uno de diez minutos no pierde detalle. Si ninguno llega hasta
+        start (historial más corto que el intervalo pedido) se usa el que llega más atrás.
+        """
+        chosen = self.levels[-1]
+        earliest = None  # nivel con la muestra más antigua, por si ninguno cubre start
+        for level_step, ring in self.levels:
+            if step is not None:
+                if level_step >= step:
+                    chosen = (level_step, ring)
+                    break
+                continue
+            oldest = ring.oldest()
+            if oldest is not None and oldest <= start:
+                chosen = (level_step, ring)
+                break
+            if oldest is not None and (earliest is None or oldest < earliest[1].oldest()):
+                earliest = (level_step, ring)
+        else:
+            if step is None and earliest is not None:
+                chosen = earliest
+        columns = chosen[1].range(start, end)
+        return chosen[0], dict(zip(COLUMNS, columns))
+
+
+class MetricsStore:
+    """
+    Historial de todos los servidores, alimentado por las consultas de 'status'.
+    Se guarda en disco en formato por columnas (ver save).
+    """
+    def __init__(self, path=None, levels=LEVELS):
+        self.path = path
+        self.level_spec = tuple(levels)
+        self._servers = {}  # "ip:puerto" -> ServerHistory
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(ip, port):
+        return f"{ip}:{int(port)}"
+
+    def record(self, ip, port, state, rtt=None, when=None):
+        """Agrega una muestra a partir de un ServerState (rtt en segundos, si se conoce)."""
+        pings = [p["ping"] for p in state["players"] if p.get("ping")]
+        row = [
+            time.time() if when is None else when,
+            len(state["players"]) + len(state["bots"]),
+            sum(pings) / len(pings) if pings else 0.0,
+            max(pings) if pings else 0.0,
+            rtt * 1000 if rtt is not None else 0.0,
+        ]
+        key = self._key(ip, port)
+        with self._lock:
+            history = self._servers.get(key)
+            if history is None:
+                history = self._servers[key] = ServerHistory(self.level_spec)
+            history.add(row)
+
+    def query(self, ip, port, start, end=None, step=None):
+        """Datos de un servidor entre start y end (epoch); ver ServerHistory.query."""
+        with self._lock:
+            history = self._servers.get(self._key(ip, port))
+            if history is None:
+                return 0, {name: [] for name in COLUMNS}
+            return history.query(start, time.time() if end is None else end, step)
+
+    def servers(self):
+        with self._lock:
+            return list(self._servers)
+
+    def save(self, path=None):
+        """
+        Guarda el historial: la firma Q2H1, un encabezado JSON con el largo de cada
+        columna y luego las columnas una tras otra como arreglos binarios. Los
+        acumuladores de intervalos sin cerrar no se guardan.
+        """
+        path = path or self.path
+        if not path:
+            return
+        header = {"byteorder": sys.byteorder, "levels": self.level_spec, "servers": {}}
+        blocks = []
+        with self._lock:
+            for key, history in self._servers.items():
+                counts = []
+                for _, ring in history.levels:
+                    blocks.extend(ring.ordered())
+                    counts.append(ring.count)
+                header["servers"][key] = counts
+        encoded = json.dumps(header).encode("utf-8")
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(_MAGIC + len(encoded).to_bytes(4, "little") + encoded)
+                for block in blocks:
+                    block.tofile(f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print("Error al guardar el historial:", e)
+
+    def load(self, path=None):
+        """Carga el historial guardado por save (si existe)."""
+        self.path = path or self.path
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                if f.read(4) != _MAGIC:
+                    raise ValueError("formato desconocido")
+                header = json.loads(f.read(int.from_bytes(f.read(4), "little")))
+                levels = tuple(tuple(level) for level in header["levels"])
+                swap = header["byteorder"] != sys.byteorder
+                servers = {}
+                for key, counts in header["servers"].items():
+                    history = ServerHistory(levels)
+                    for (_, ring), count in zip(history.levels, counts):
+                        for i, code in enumerate(_TYPECODES):
+                            column = array(code)
+                            column.fromfile(f, count)
+                            if swap:
+                                column.byteswap()
+                            ring.columns[i][:count] = column
+                        ring.count = count
+                    servers[key] = history
+        except (OSError, ValueError, KeyError, EOFError) as e:
+            print("Error al leer el historial:", e)
+            return
+        with self._lock:
+            self.level_spec = levels
+            self._servers.update(servers)
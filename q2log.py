@@ -0,0 +1,224 @@
+#################################################################
+# Escritura de logs en segundo plano con rotación               #
+#################################################################
+import datetime
+import locale
+import mmap
+import os
+import queue
+import threading
+import time
+
+class LogWriter:
+    """
+    Escribe las líneas de log desde un único hilo que mantiene el archivo
+    abierto. Las líneas se encolan desde cualquier hilo y se escriben en
+    lotes; el archivo se rota al superar max_bytes o max_age segundos,
+    conservando backup_count copias (logs.txt.1, logs.txt.2, ...).
+    """
+    def __init__(self, path, max_bytes=1024 * 1024, max_age=7 * 24 * 3600, backup_count=3,
+                 flush_interval=0.25):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._listeners = []
+        self._file = None
+        self._opened = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add_listener(self, callback):
+        """callback(lines) se llama desde el hilo de escritura con cada lote escrito."""
+        self._listeners.append(callback)
+
+    def write(self, msg):
+        """Encola un mensaje con fecha/hora; devuelve la línea tal como se escribirá."""
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        entry = f"{timestamp} - {msg}\n"
+        self._queue.put(entry)
+        return entry
+
+    def close(self):
+        """Escribe lo pendiente y detiene el hilo."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _open(self):
+        self._file = open(self.path, "a")
+        # La antigüedad de un archivo existente se cuenta desde su primera línea,
+        # escrita al crearlo o rotarlo (la fecha de modificación cambia con cada escritura)
+        self._opened = (self._file.tell() and self._first_timestamp()) or time.time()
+
+    def _first_timestamp(self):
+        """Fecha/hora de la primera línea del archivo (epoch); None si no se puede leer."""
+        try:
+            with open(self.path, "rb") as f:
+                first = f.readline(64)[:19].decode("ascii")
+            return datetime.datetime.strptime(first, "%Y-%m-%d %H:%M:%S").timestamp()
+        except (OSError, ValueError):
+            return None
+
+    def _should_rotate(self, incoming):
+        """Si hay que rotar antes de escribir incoming bytes (un archivo vacío nunca se rota)."""
+        size = self._file.tell()
+        return size and (size + incoming > self.max_bytes or
+                         (self.max_age and time.time() - self._opened >= self.max_age))
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a")
+        self._opened = time.time()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            lines = [self._queue.get()]
+            # Se agrupa todo lo que llegue durante flush_interval en una sola escritura
+            deadline = time.monotonic() + self.flush_interval
+            while lines[-1] is not None:
+                remaining = deadline - time.monotonic()
+                try:
+                    lines.append(self._queue.get(timeout=remaining) if remaining > 0
+                                 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if lines[-1] is None:
+                stop = True
+                lines.pop()
+            if not lines:
+                continue
+            try:
+                if self._file is None:
+                    self._open()
+                data = "".join(lines)
+                # Se rota antes de escribir, así el archivo actual nunca queda vacío
+                # con las últimas líneas en la copia
+                if self._should_rotate(len(data.encode(self._file.encoding, "replace"))):
+                    self._rotate()
+                self._file.write(data)
+                self._file.flush()
+            except Exception as e:
+                print(f"Error al escribir log: {e}")
+            for callback in self._listeners:
+                try:
+                    callback(lines)
+                except Exception as e:
+                    print(f"Error al mostrar log: {e}")
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class LogFileView:
+    """
+    Lee un archivo de log por páginas desde el final usando mmap, sin
+    cargarlo entero: tail() devuelve las últimas líneas y older() las
+    anteriores a las ya entregadas, así el costo no depende del tamaño.
+    Al llegar al inicio del archivo sigue con las copias rotadas
+    (logs.txt.1, logs.txt.2, ...), y como el archivo se sigue por su
+    identidad, una rotación a mitad de camino no corta el historial.
+    """
+    def __init__(self, path, encoding=None):
+        self.path = path
+        self.encoding = encoding or locale.getpreferredencoding(False)
+        self._top = 0  # posición (en bytes) de la primera línea ya entregada
+        self._identity = None  # (dispositivo, inodo) del archivo al que se refiere _top
+
+    def _backup(self, index):
+        """Ruta del archivo index: 0 es el actual, 1 la copia más reciente, etc."""
+        return f"{self.path}.{index}" if index else self.path
+
+    def _map(self, path):
+        """
+        Mapea el archivo completo en memoria; devuelve (mmap, identidad), con
+        mmap None si está vacío, o (None, None) si no existe.
+        """
+        try:
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                identity = (st.st_dev, st.st_ino)
+                if st.st_size == 0:
+                    return None, identity
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), identity
+        except FileNotFoundError:
+            return None, None
+
+    def _locate(self):
+        """Posición en la cadena de copias del archivo que se está leyendo (None si ya no está)."""
+        index = 0
+        while self._identity is not None:
+            try:
+                st = os.stat(self._backup(index))
+            except FileNotFoundError:
+                return None
+            if (st.st_dev, st.st_ino) == self._identity:
+                return index
+            index += 1
+        return None
+
+    def _lines_before(self, mm, end, count):
+        """Busca hacia atrás count líneas que terminan en end; devuelve (inicio, texto)."""
+        start = end
+        pos = end - 1
+        for _ in range(count):
+            if pos < 0:
+                break
+            i = mm.rfind(b"\n", 0, pos)
+            start = i + 1
+            if i < 0:
+                break
+            pos = i
+        return start, mm[start:end].decode(self.encoding, errors="replace")
+
+    def tail(self, count):
+        """Últimas count líneas del archivo."""
+        mm, self._identity = self._map(self.path)
+        if mm is None:
+            self._top = 0
+            return ""
+        with mm:
+            self._top, text = self._lines_before(mm, len(mm), count)
+        return text
+
+    def older(self, count):
+        """Las count líneas anteriores a las ya entregadas ("" al llegar al inicio de todo)."""
+        index = self._locate()
+        if index is None:
+            self.skip_history()
+            return ""
+        mm, identity = self._map(self._backup(index))
+        if identity != self._identity or (len(mm) if mm is not None else 0) < self._top:
+            # El archivo se truncó o se reemplazó mientras tanto: no hay más historia
+            if mm is not None:
+                mm.close()
+            self.skip_history()
+            return ""
+        while self._top == 0:
+            # Inicio de este archivo: se sigue por la copia anterior
+            if mm is not None:
+                mm.close()
+            index += 1
+            mm, self._identity = self._map(self._backup(index))
+            if self._identity is None:
+                self.skip_history()
+                return ""
+            self._top = len(mm) if mm is not None else 0
+        with mm:
+            self._top, text = self._lines_before(mm, self._top, count)
+        return text
+
+    def skip_history(self):
+        """No ofrecer más líneas antiguas (por ejemplo tras limpiar la vista)."""
+        self._top = 0
+        self._identity = None
@@ -0,0 +1,153 @@
+#################################################################
+# Métricas de consultas y comandos RCON                         #
+#################################################################
+# Contadores e histogramas por servidor (consultas, timeouts, bytes,
+# latencias). Vienen desactivados: cada punto de medición pregunta
+# primero "if metrics.enabled", así que sin activarlos el costo es una
+# lectura de atributo. Se pueden exponer en texto de Prometheus o JSON
+# con un pequeño servidor HTTP local (serve).
+import json
+import threading
+
+# Límites (en segundos) de los histogramas de latencia
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_HELP = {
+    "q2_status_queries_total": "Consultas 'status' enviadas",
+    "q2_status_timeouts_total": "Consultas 'status' sin respuesta a tiempo",
+    "q2_status_errors_total": "Respuestas 'status' que no se pudieron interpretar",
+    "q2_status_seconds": "Tiempo hasta la respuesta a 'status'",
+    "q2_rcon_commands_total": "Comandos RCON enviados",
+    "q2_rcon_timeouts_total": "Comandos RCON sin respuesta",
+    "q2_rcon_seconds": "Duración de los comandos RCON, incluida la espera tras el último paquete",
+    "q2_bytes_sent_total": "Bytes UDP enviados",
+    "q2_bytes_received_total": "Bytes UDP recibidos",
+    "q2_server_list_total": "Pedidos de la lista de servidores",
+    "q2_server_list_errors_total": "Pedidos de la lista de servidores que fallaron",
+    "q2_server_list_seconds": "Duración de los pedidos de la lista de servidores",
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Metrics:
+    """Registro de contadores e histogramas con etiquetas (por ejemplo server="ip:puerto")."""
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._counters = {}  # (nombre, etiquetas) -> valor
+        self._histograms = {}  # (nombre, etiquetas) -> [cuentas por límite..., suma, cantidad]
+        self._lock = threading.Lock()
+        self._server = None
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += seconds
+            entry[-1] += 1
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_dict(self):
+        """Todas las métricas como listas de {name, labels, value} (histogramas con sus buckets)."""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = []
+            for (name, labels), entry in sorted(self._histograms.items()):
+                histograms.append({"name": name, "labels": dict(labels), "count": entry[-1],
+                                   "sum": entry[-2],
+                                   "buckets": dict(zip(map(str, BUCKETS), entry[:len(BUCKETS)]))})
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self):
+        """Formato de texto de Prometheus (los buckets son acumulados, como pide el formato)."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(entry)) for key, entry in self._histograms.items())
+        described = set()
+        for (name, labels), value in counters:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), entry in histograms:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+            total = 0
+            for bound, count in zip(BUCKETS, entry):
+                total += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {total}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {entry[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {entry[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {entry[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=9108, host="127.0.0.1"):
+        """
+        Activa las métricas y las publica en http://host:port/metrics (Prometheus)
+        y /metrics.json desde un hilo aparte. Devuelve la dirección real.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, kind = registry.to_prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, kind = json.dumps(registry.to_dict()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", kind + "; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self.enabled = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Registro compartido por q2query y q2rcon
+metrics = Metrics()
@@ -0,0 +1,162 @@
+#################################################################
+# Modelo compacto del estado de servidores y jugadores          #
+#################################################################
+# Objetos con __slots__ en vez de diccionarios: ocupan una fracción
+# de la memoria cuando se guarda el estado de cientos de servidores.
+# Siguen pudiendo leerse como diccionarios (state["players"],
+# player.get("name")) para no romper el código existente.
+import sys
+from collections.abc import Mapping
+
+def intern(value):
+    """Interna textos que se repiten entre servidores y consultas (mapas, versiones, claves)."""
+    return sys.intern(value) if type(value) is str else value
+
+
+class _Record(Mapping):
+    """Acceso de solo lectura estilo diccionario sobre los campos de la clase."""
+    __slots__ = ()
+    # Campos visibles como claves, en orden
+    _keys = ()
+    # Campos que, si valen None, se consideran ausentes (como una clave que no existe)
+    _optional = ()
+
+    def __getitem__(self, key):
+        if key in self._keys:
+            value = getattr(self, key)
+            if value is not None or key not in self._optional:
+                return value
+        raise KeyError(key)
+
+    def __iter__(self):
+        for key in self._keys:
+            if key not in self._optional or getattr(self, key) is not None:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def to_dict(self):
+        """Copia en diccionarios y listas simples (por ejemplo para guardarla como JSON)."""
+        return {key: _plain(value) for key, value in self.items()}
+
+
+def _plain(value):
+    if isinstance(value, _Record):
+        return value.to_dict()
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+# Tupla de claves -> {clave: posición}; los servidores con las mismas claves comparten el índice
+_key_indexes = {}
+_MAX_KEY_INDEXES = 1024
+
+class RawInfo(Mapping):
+    """Pares clave/valor de la respuesta a 'status', guardando sólo la tupla de valores."""
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, pairs=()):
+        pairs = dict(pairs)
+        keys = tuple(pairs)
+        index = _key_indexes.get(keys)
+        if index is None:
+            index = {intern(key): i for i, key in enumerate(keys)}
+            if len(_key_indexes) < _MAX_KEY_INDEXES:
+                _key_indexes[keys] = index
+        self._index = index
+        self._values = tuple(intern(value) for value in pairs.values())
+
+    def __getitem__(self, key):
+        return self._values[self._index[key]]
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get(self, key, default=None):
+        i = self._index.get(key)
+        return default if i is None else self._values[i]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return f"RawInfo({dict(self)!r})"
+
+
+class PlayerInfo(_Record):
+    """Jugador de la respuesta a 'status' de Quake II."""
+    __slots__ = ("frags", "ping", "name", "address")
+    _keys = _optional = __slots__
+
+    def __init__(self, frags=None, ping=None, name=None, address=None):
+        self.frags = frags
+        self.ping = ping
+        self.name = intern(name)
+        self.address = intern(address)
+
+
+class Q1PlayerInfo(PlayerInfo):
+    """Jugador de la respuesta a 'status' de Quake (1)."""
+    __slots__ = ("id", "score", "time", "skin", "color1", "color2")
+    _keys = _optional = ("id", "score", "time", "ping", "name", "skin", "color1", "color2")
+
+    def __init__(self, id=None, score=None, time=None, ping=None, name=None, skin=None,
+                 color1=None, color2=None):
+        super().__init__(ping=ping, name=name)
+        self.id = id
+        self.score = score
+        self.time = time
+        self.skin = intern(skin)
+        self.color1 = color1
+        self.color2 = color2
+
+
+class ServerState(_Record):
+    """Estado de un servidor según su respuesta a 'status'."""
+    __slots__ = _keys = ("raw", "players", "bots", "password", "map", "maxplayers", "name",
+                         "numplayers", "version")
+
+    def __init__(self, raw=None, players=(), bots=(), password=None, map=None, maxplayers=None,
+                 name=None, numplayers=0, version=None):
+        self.raw = raw if isinstance(raw, RawInfo) else RawInfo(raw or ())
+        self.players = tuple(players)
+        self.bots = tuple(bots)
+        self.password = intern(password)
+        self.map = intern(map)
+        self.maxplayers = intern(maxplayers)
+        self.name = name
+        self.numplayers = intern(numplayers)
+        self.version = intern(version)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Inversa de to_dict para un estado de Quake II."""
+        data = dict(data)
+        for key in ("players", "bots"):
+            data[key] = [PlayerInfo(**player) for player in data.get(key, ())]
+        return cls(**data)
+
+
+class RconPlayer(_Record):
+    """Fila de jugador del comando RCON 'status'."""
+    __slots__ = _keys = ("num", "score", "ping", "name", "lastmsg", "ip_address", "rate_pps", "ver")
+
+    def __init__(self, num, score, ping, name, lastmsg, ip_address, rate_pps, ver):
+        self.num = num
+        self.score = score
+        self.ping = intern(ping)
+        self.name = intern(name)
+        self.lastmsg = lastmsg
+        self.ip_address = ip_address
+        self.rate_pps = intern(rate_pps)
+        self.ver = ver
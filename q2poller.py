@@ -0,0 +1,107 @@
+#################################################################
+# Sondeo continuo y adaptativo del estado de los servidores     #
+#################################################################
+import random
+import threading
+import time
+
+import q2query
+from q2rtt import rtt_table
+
+class StatusPoller:
+    """
+    Consulta en segundo plano el 'status' de todos los servidores de la lista.
+    Los servidores con jugadores se consultan cada busy_interval segundos; los
+    vacíos o caídos duplican su intervalo (desde idle_interval hasta max_interval).
+    Cada ronda consulta como máximo batch_size servidores y sólo avisa con
+    on_change(server, state) cuando cambia el mapa o la cantidad de jugadores.
+    Sin timeout, la espera por cada servidor se ajusta a su RTT medido.
+    """
+    def __init__(self, on_change, busy_interval=5.0, idle_interval=20.0, max_interval=300.0,
+                 batch_size=32, timeout=None, cache=None, history=None):
+        self.on_change = on_change
+        self.busy_interval = busy_interval
+        self.idle_interval = idle_interval
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.cache = cache if cache is not None else q2query.status_cache
+        self.history = history  # q2history.MetricsStore opcional que guarda cada respuesta
+        self._schedule = {}  # (ip, port) -> [próxima consulta, intervalo actual]
+        self._summaries = {}  # (ip, port) -> último resumen notificado
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def set_servers(self, servers):
+        """Reemplaza la lista de servidores [(ip, port), ...] a sondear."""
+        now = time.monotonic()
+        with self._lock:
+            schedule = {}
+            for server in servers:
+                # Los servidores nuevos se consultan de inmediato, los conocidos conservan su ritmo
+                schedule[server] = self._schedule.get(server, [now, self.busy_interval])
+            self._schedule = schedule
+            self._summaries = {s: v for s, v in self._summaries.items() if s in schedule}
+        self._wake.set()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _due(self):
+        """Servidores que toca consultar (los más atrasados primero) y espera hasta el próximo."""
+        now = time.monotonic()
+        with self._lock:
+            due = sorted((t[0], s) for s, t in self._schedule.items() if t[0] <= now)
+            upcoming = [t[0] for t in self._schedule.values() if t[0] > now]
+        servers = [s for _, s in due[:self.batch_size]]
+        wait = min(upcoming) - now if upcoming and not servers else 0
+        return servers, wait
+
+    def _run(self):
+        while not self._stopped.is_set():
+            servers, wait = self._due()
+            if not servers:
+                self._wake.wait(wait if wait else None)
+                self._wake.clear()
+                continue
+            try:
+                q2query.query_all(servers, timeout=self.timeout, callback=self._result)
+            except Exception as e:
+                print("Error en el sondeo de servidores:", e)
+                self._stopped.wait(self.timeout or q2query.Quake2Query.default_timeout)
+
+    def _result(self, server, state, error):
+        with self._lock:
+            entry = self._schedule.get(server)
+            if entry is None:
+                return
+            busy = error is None and (state["players"] or state["bots"])
+            if busy:
+                interval = self.busy_interval
+            elif entry[1] < self.idle_interval:
+                interval = self.idle_interval
+            else:
+                interval = min(entry[1] * 2, self.max_interval)
+            # Un poco de azar evita que todos los servidores vuelvan a coincidir en la misma ronda
+            entry[:] = [time.monotonic() + interval * random.uniform(0.9, 1.1), interval]
+            if error is not None:
+                return
+            summary = (state["map"], len(state["players"]) + len(state["bots"]), state["maxplayers"])
+            changed = self._summaries.get(server) != summary
+            self._summaries[server] = summary
+        self.cache.put(server[0], server[1], state)
+        if self.history is not None:
+            self.history.record(server[0], server[1], state, rtt_table.last(*server))
+        if changed:
+            self.on_change(server, state)
@@ -1,41 +1,287 @@
 ###############################################
 # Clase que implementa el protocolo de Quake II #
 ###############################################
+# asyncio, requests y tkinter se importan recién donde se usan: así una
+# consulta simple desde la línea de comandos (q2cli) arranca rápido y
+# funciona sin pantalla.
+import json
+import os
+import re
 import socket
-from bs4 import BeautifulSoup
-import requests
-from tkinter import messagebox
+import threading
+import time
+from collections import OrderedDict
+from html.parser import HTMLParser
+from q2model import ServerState, RawInfo, PlayerInfo, Q1PlayerInfo
+from q2rtt import rtt_table
+from q2metrics import metrics
+from q2trace import tracer, traced
 
 ###############################################################
-# Función para obtener la lista de servidores (web scraping)  #
+# Función para obtener la lista de servidores                 #
 ###############################################################
 
-def get_server_data():
-    url = "http://q2servers.com/?mod=*&g=dday&m=*&c=*&ac=*&s=&player="
-    response = requests.get(url)
+# Servidores maestros de Quake II (protocolo UDP nativo)
+MASTER_SERVERS = [("master.quakeservers.net", 27900), ("q2servers.com", 27900)]
+GAME = "dday"
+
+def get_server_data(game=GAME, masters=None):
+    """
+    Obtiene la lista de servidores desde los servidores maestros y, si no se
+    obtiene nada, recurre al scraping de q2servers.com.
+    """
+    start = time.monotonic()
+    try:
+        servers = get_server_data_master(game=game, masters=masters)
+    except Exception as e:
+        print("Error al consultar los servidores maestros:", e)
+        servers = []
+    source = "master"
+    if not servers:
+        if metrics.enabled:
+            metrics.inc("q2_server_list_errors_total", source=source)
+        source = "html"
+        try:
+            servers = get_server_data_html()
+        except Exception:
+            if metrics.enabled:
+                metrics.inc("q2_server_list_errors_total", source=source)
+            raise
+    if metrics.enabled:
+        metrics.inc("q2_server_list_total", source=source)
+        metrics.observe("q2_server_list_seconds", time.monotonic() - start, source=source)
+    return servers
+
+###############################################################
+# Cliente del protocolo de servidor maestro de Quake II       #
+###############################################################
+
+def query_master(host, port=27900, timeout=2.0):
+    """Pide la lista de servidores a un maestro y devuelve [(ip, port), ...]."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    data = b""
+    try:
+        sock.sendto(b"query\n\x00", (host, port))
+        # La lista puede llegar en varios paquetes; se lee hasta que no llegue nada más
+        while True:
+            try:
+                packet, _ = sock.recvfrom(65535)
+            except socket.timeout:
+                break
+            data += parse_master_packet(packet)
+            sock.settimeout(0.3)
+    finally:
+        sock.close()
+    if not data:
+        raise Exception(f"Sin respuesta del servidor maestro {host}:{port}")
+    return parse_master_addresses(data)
+
+def parse_master_packet(packet):
+    """Quita la cabecera 'servers' del paquete y devuelve los bytes de direcciones."""
+    header = b"\xff\xff\xff\xffservers"
+    if not packet.startswith(header):
+        raise Exception("Respuesta inválida del servidor maestro")
+    body = packet[len(header):]
+    # El separador tras "servers" es un espacio o un salto de línea
+    if body[:1] in (b" ", b"\n"):
+        body = body[1:]
+    return body
+
+def parse_master_addresses(data):
+    """Convierte bloques de 6 bytes (IPv4 + puerto big-endian) en [(ip, port), ...]."""
+    addresses = []
+    seen = set()
+    for i in range(0, len(data) - 5, 6):
+        ip = socket.inet_ntoa(data[i:i + 4])
+        port = int.from_bytes(data[i + 4:i + 6], "big")
+        if port and (ip, port) not in seen:
+            seen.add((ip, port))
+            addresses.append((ip, port))
+    return addresses
+
+def get_server_data_master(game=GAME, masters=None, timeout=3.0):
+    """
+    Consulta los servidores maestros y luego el 'status' de cada servidor en paralelo.
+    Devuelve la lista en el mismo formato que el scraping.
+    """
+    addresses = []
+    for host, port in (masters or MASTER_SERVERS):
+        try:
+            addresses = list(dict.fromkeys(addresses + query_master(host, port)))
+        except Exception as e:
+            print("Error al consultar el maestro:", e)
+    if not addresses:
+        return []
+
+    states = query_all(addresses, timeout=timeout)
+    servers = []
+    for (ip, port), state in states.items():
+        raw = state["raw"]
+        server_game = raw.get("gamename") or raw.get("game") or ""
+        if game and server_game.lower() != game.lower():
+            continue
+        servers.append({
+            "Hostname": state["name"] or f"{ip}:{port}",
+            "IP": f"quake2://{ip}:{port}",
+            "Game": server_game,
+            "Map": state["map"] or "",
+            "Players": format_players(state)
+        })
+    servers.sort(key=lambda srv: srv["Hostname"].lower())
+    return servers
+
+def format_players(state):
+    """Texto 'jugadores/máximo' para la columna Players."""
+    return f"{len(state['players']) + len(state['bots'])}/{state['maxplayers'] or '?'}"
+
+###############################################################
+# Respaldo: lista de servidores por web scraping              #
+###############################################################
+
+SERVERS_URL = "http://q2servers.com/?mod=*&g=dday&m=*&c=*&ac=*&s=&player="
+HTML_CACHE_FILE = "servers_cache.json"
+
+# Sesión HTTP compartida: mantiene la conexión abierta entre refrescos
+_http_session = None
+_html_cache = None
+
+def _get_http_session():
+    global _http_session
+    if _http_session is None:
+        import requests
+        _http_session = requests.Session()
+        _http_session.headers["Accept-Encoding"] = "gzip, deflate"
+    return _http_session
+
+def _load_html_cache():
+    """Devuelve el caché en memoria o, si no existe, el guardado en disco."""
+    global _html_cache
+    if _html_cache is None:
+        _html_cache = {}
+        if os.path.exists(HTML_CACHE_FILE):
+            try:
+                with open(HTML_CACHE_FILE, "r", encoding="utf-8") as f:
+                    _html_cache = json.load(f)
+            except (OSError, ValueError) as e:
+                print("Error al leer el caché de servidores:", e)
+    return _html_cache
+
+def _save_html_cache(cache):
+    global _html_cache
+    _html_cache = cache
+    try:
+        with open(HTML_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+    except OSError as e:
+        print("Error al guardar el caché de servidores:", e)
+
+def get_server_data_html(url=SERVERS_URL):
+    """
+    Descarga la página de q2servers.com con una petición condicional
+    (ETag / Last-Modified). Si la página no cambió (304) se devuelve la lista
+    guardada sin volver a parsear.
+    """
+    cache = _load_html_cache()
+    headers = {}
+    if cache.get("url") == url:
+        if cache.get("etag"):
+            headers["If-None-Match"] = cache["etag"]
+        if cache.get("last_modified"):
+            headers["If-Modified-Since"] = cache["last_modified"]
+    response = _get_http_session().get(url, headers=headers, timeout=10)
+    if response.status_code == 304 and "servers" in cache:
+        return list(cache["servers"])
     servers = []
     if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        server_blocks = soup.find_all(class_="server")
-        for server in server_blocks:
-            tds = server.find_all("td")
-            if len(tds) >= 7:
-                hostname = tds[1].get_text(strip=True)
-                ip = tds[3].get_text(strip=True)
-                game = tds[4].get_text(strip=True)
-                map_name = tds[5].get_text(strip=True)
-                players = tds[6].get_text(strip=True)
-                servers.append({
-                    "Hostname": hostname,
-                    "IP": ip,
-                    "Game": game,
-                    "Map": map_name,
-                    "Players": players
-                })
+        servers = parse_server_rows(response.text)
+        _save_html_cache({
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "servers": servers
+        })
     else:
         print("Error al acceder a la página:", response.status_code)
     return servers
 
+class _ServerRowParser(HTMLParser):
+    """
+    Tokenizador que sólo guarda el texto de las celdas <td> dentro de los
+    elementos con clase "server", sin construir el árbol completo.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self._row_tag = None
+        self._row_depth = 0
+        self._cells = None
+        self._open_cells = []
+
+    def handle_starttag(self, tag, attrs):
+        if self._row_tag is None or tag == self._row_tag:
+            classes = (dict(attrs).get("class") or "").split()
+            if "server" in classes:
+                if self._row_tag is not None:
+                    self._end_row()
+                self._row_tag = tag
+                self._row_depth = 1
+                self._cells = []
+                return
+        if self._row_tag is None:
+            return
+        if tag == self._row_tag:
+            self._row_depth += 1
+        elif tag == "td":
+            cell = []
+            self._cells.append(cell)
+            self._open_cells.append(cell)
+
+    def handle_endtag(self, tag):
+        if self._row_tag is None:
+            return
+        if tag == "td" and self._open_cells:
+            self._open_cells.pop()
+        elif tag == self._row_tag:
+            self._row_depth -= 1
+            if self._row_depth == 0:
+                self._end_row()
+
+    def handle_data(self, data):
+        if self._open_cells:
+            data = data.strip()
+            if data:
+                for cell in self._open_cells:
+                    cell.append(data)
+
+    def _end_row(self):
+        self.rows.append(["".join(cell) for cell in self._cells])
+        self._row_tag = None
+        self._cells = None
+        self._open_cells = []
+
+    def close(self):
+        super().close()
+        if self._row_tag is not None:
+            self._end_row()
+
+def parse_server_rows(html):
+    """Extrae los servidores de las filas '.server' de la página de q2servers.com."""
+    parser = _ServerRowParser()
+    parser.feed(html)
+    parser.close()
+    servers = []
+    for tds in parser.rows:
+        if len(tds) >= 7:
+            servers.append({
+                "Hostname": tds[1],
+                "IP": tds[3],
+                "Game": tds[4],
+                "Map": tds[5],
+                "Players": tds[6]
+            })
+    return servers
+
 ###############################################################
 # Función auxiliar para parsear la URL del servidor (quake2://) #
 ###############################################################
@@ -60,19 +306,38 @@ def parse_quake2_url(url):
 ###############################################################
 
 def update_players(server, players_tree):
+    global _shown_server
+    from tkinter import messagebox
     try:
         ip, port = parse_quake2_url(server["IP"])
     except Exception as e:
         messagebox.showerror("Error", f"Error al parsear IP:\n{e}")
         return
 
-    query = Quake2Query(is_quake1=False)
-    try:
-        state = query.query(ip, port)
-    except Exception as e:
-        messagebox.showerror("Error", f"Error al consultar el servidor:\n{e}")
-        return
+    _shown_server = (ip, port)
 
+    def refreshed(state, error):
+        # Llega desde el hilo de consulta: se pasa al hilo de Tk
+        players_tree.after(0, lambda: show_refreshed(state, error))
+
+    def show_refreshed(state, error):
+        # El usuario pudo haber seleccionado otro servidor mientras tanto
+        if _shown_server != (ip, port):
+            return
+        if error is not None:
+            if cached is None:
+                messagebox.showerror("Error", f"Error al consultar el servidor:\n{error}")
+            return
+        fill_players(players_tree, state)
+
+    # Se muestra al instante lo que haya en caché; si está vencido se refresca en segundo plano
+    cached = status_cache.fetch(ip, port, callback=refreshed)
+    if cached is not None:
+        fill_players(players_tree, cached)
+    else:
+        players_tree.delete(*players_tree.get_children())
+
+def fill_players(players_tree, state):
     players = state.get("players", [])
     # Limpiar la tabla de jugadores
     for item in players_tree.get_children():
@@ -85,7 +350,215 @@ def update_players(server, players_tree):
         address = player.get("address", "N/A")
         players_tree.insert("", "end", values=(name, frags, ping, address))
 
+###############################################################
+# Caché de estados con TTL (stale-while-revalidate)           #
+###############################################################
+
+class StatusCache:
+    """
+    Guarda el último 'status' de cada servidor. Una entrada vencida se sigue
+    entregando mientras se refresca en segundo plano; las menos usadas se
+    descartan al superar max_entries.
+    """
+    def __init__(self, ttl=5.0, max_entries=256, timeout=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # (ip, port) -> (state, hora de la consulta)
+        self._refreshing = {}  # (ip, port) -> callbacks pendientes
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, callback):
+        """callback((ip, port), state) se llama con cada estado nuevo, desde el hilo que lo guarda."""
+        self._listeners.append(callback)
+
+    def get(self, ip, port):
+        """Devuelve el estado guardado (aunque esté vencido) o None."""
+        with self._lock:
+            entry = self._entries.get((ip, port))
+            return entry[0] if entry else None
+
+    def age(self, ip, port):
+        """Segundos desde la última consulta exitosa, o None si no hay entrada."""
+        with self._lock:
+            entry = self._entries.get((ip, port))
+        return time.monotonic() - entry[1] if entry else None
+
+    def put(self, ip, port, state, age=0.0):
+        """Guarda el estado; age permite cargar uno ya viejo (por ejemplo desde disco)."""
+        with self._lock:
+            self._entries[(ip, port)] = (state, time.monotonic() - age)
+            self._entries.move_to_end((ip, port))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        for callback in self._listeners:
+            callback((ip, port), state)
+
+    def fetch(self, ip, port, callback=None):
+        """
+        Devuelve el estado en caché (o None) y, si falta o está vencido, lanza
+        una consulta en segundo plano que llamará a callback(state, error).
+        """
+        key = (ip, port)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if time.monotonic() - entry[1] < self.ttl:
+                    self.hits += 1
+                    return entry[0]
+                self.stale += 1
+            else:
+                self.misses += 1
+            # Si ya hay una consulta en curso para este servidor, sólo se agrega el callback
+            callbacks = self._refreshing.get(key)
+            start = callbacks is None
+            if start:
+                callbacks = self._refreshing[key] = []
+            if callback:
+                callbacks.append(callback)
+        if start:
+            threading.Thread(target=self._refresh, args=(ip, port), daemon=True).start()
+        return entry[0] if entry else None
+
+    def _refresh(self, ip, port):
+        state, error = None, None
+        try:
+            state = Quake2Query(is_quake1=False).query(ip, port, timeout=self.timeout)
+            self.put(ip, port, state)
+        except Exception as e:
+            error = e
+        with self._lock:
+            callbacks = self._refreshing.pop((ip, port), [])
+        for callback in callbacks:
+            callback(state, error)
+
+    def items(self):
+        """[((ip, port), (state, edad en segundos)), ...] de las entradas guardadas."""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, (state, now - fetched)) for key, (state, fetched) in self._entries.items()]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "entries": len(self._entries)
+            }
+
+status_cache = StatusCache()
+_shown_server = None
+
+###############################################################
+# Última lista de servidores conocida (para el inicio)        #
+###############################################################
+
+SNAPSHOT_FILE = "servers_snapshot.json"
+
+def save_server_snapshot(servers, path=SNAPSHOT_FILE, cache=None):
+    """Guarda la lista de servidores y el último 'status' de cada uno para el próximo inicio."""
+    cache = cache if cache is not None else status_cache
+    data = {
+        "saved": time.time(),
+        "servers": servers,
+        "statuses": {f"{ip}:{port}": {"age": age, "state": state.to_dict()}
+                     for (ip, port), (state, age) in cache.items()}
+    }
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print("Error al guardar la lista de servidores:", e)
+
+def load_server_snapshot(path=SNAPSHOT_FILE, cache=None):
+    """
+    Devuelve la lista de servidores guardada ([] si no hay) y carga los estados en la
+    caché con su antigüedad real, así se muestran al instante pero se vuelven a consultar.
+    """
+    cache = cache if cache is not None else status_cache
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        elapsed = max(time.time() - data.get("saved", 0), 0)
+        for key, entry in data.get("statuses", {}).items():
+            ip, port = parse_quake2_url(key)
+            cache.put(ip, port, ServerState.from_dict(entry["state"]), age=entry["age"] + elapsed)
+        return list(data.get("servers", []))
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        print("Error al leer la lista de servidores guardada:", e)
+        return []
+
+###############################################################
+# Consulta concurrente de muchos servidores (asyncio)         #
+###############################################################
+
+class _StatusProtocol:
+    """
+    Protocolo UDP compartido: encola cada respuesta junto a su dirección de origen.
+    Implementa la interfaz de asyncio.DatagramProtocol sin heredarla, para no
+    importar asyncio al cargar el módulo.
+    """
+    def __init__(self, queue):
+        self.queue = queue
+
+    def connection_made(self, transport):
+        pass
+
+    def connection_lost(self, exc):
+        pass
+
+    def pause_writing(self):
+        pass
+
+    def resume_writing(self):
+        pass
+
+    def datagram_received(self, data, addr):
+        self.queue.put_nowait((addr[0], addr[1], data))
+
+    def error_received(self, exc):
+        # ICMP "port unreachable" y similares: el servidor simplemente no responderá
+        pass
+
+
+def query_all(servers, timeout=None, callback=None, is_quake1=False):
+    """
+    Versión síncrona de Quake2Query.query_many para usar desde hilos.
+    Llama a callback((ip, port), state, error) a medida que llegan las respuestas
+    y devuelve un diccionario {(ip, port): state} con los servidores que respondieron.
+    """
+    import asyncio
+
+    async def run():
+        results = {}
+        query = Quake2Query(is_quake1=is_quake1)
+        async for server, state, error in query.query_many(servers, timeout=timeout):
+            if error is None:
+                results[server] = state
+            if callback:
+                callback(server, state, error)
+        return results
+    return asyncio.run(run())
+
+
 class Quake2Query:
+    # Espera máxima por un servidor cuando no se indica timeout; con mediciones
+    # de RTT (q2rtt) la espera real se ajusta a cada servidor
+    default_timeout = 3.0
+
     def __init__(self, is_quake1=False):
         self.encoding = 'latin1'
         self.delimiter = '\n'
@@ -93,22 +566,139 @@ class Quake2Query:
         self.response_header = 'print'
         self.is_quake1 = is_quake1
 
-    def query(self, ip, port=27960, timeout=3.0):
-        """Realiza la query al servidor de Quake II y devuelve un diccionario con la info."""
+    def _timeout(self, ip, port):
+        return rtt_table.timeout(ip, port, self.default_timeout, ceiling=self.default_timeout)
+
+    @traced("q2query.query")
+    def query(self, ip, port=27960, timeout=None):
+        """
+        Realiza la query al servidor de Quake II y devuelve un ServerState con la info.
+        Sin timeout se espera según el RTT medido del servidor.
+        """
+        if timeout is None:
+            timeout = self._timeout(ip, port)
+        # Cada fase queda medida por separado cuando las trazas (q2trace) están activas
+        with tracer.span("q2query.resolve", server=f"{ip}:{port}"):
+            server_address = socket.getaddrinfo(ip, port, socket.AF_INET, socket.SOCK_DGRAM)[0][4]
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         sock.settimeout(timeout)
-        server_address = (ip, port)
 
         # Construir el paquete: 4 bytes 0xff, luego "status" y un byte nulo
         packet = b'\xff\xff\xff\xff' + self.send_header.encode(self.encoding) + b'\x00'
         try:
-            sock.sendto(packet, server_address)
-            data, _ = sock.recvfrom(4096)
+            with tracer.span("q2query.send"):
+                sock.sendto(packet, server_address)
+            sent = time.monotonic()
+            with tracer.span("q2query.wait", timeout=timeout) as span:
+                data, _ = sock.recvfrom(4096)
+                span.set(bytes=len(data))
+            rtt = time.monotonic() - sent
+            rtt_table.observe(ip, port, rtt)
         except socket.timeout:
+            rtt_table.timed_out(ip, port)
+            if metrics.enabled:
+                self._count_query(ip, port, len(packet), timed_out=True)
             raise Exception("Tiempo de espera agotado al conectarse al servidor")
         finally:
             sock.close()
 
+        if metrics.enabled:
+            self._count_query(ip, port, len(packet), rtt, len(data))
+        with tracer.span("q2query.parse"):
+            return self._parse_counted(data, ip, port)
+
+    def _count_query(self, ip, port, sent, rtt=None, received=0, timed_out=False):
+        server = f"{ip}:{port}"
+        metrics.inc("q2_status_queries_total", server=server)
+        metrics.inc("q2_bytes_sent_total", sent, server=server)
+        if timed_out:
+            metrics.inc("q2_status_timeouts_total", server=server)
+            return
+        metrics.inc("q2_bytes_received_total", received, server=server)
+        metrics.observe("q2_status_seconds", rtt, server=server)
+
+    def _parse_counted(self, data, ip, port):
+        """parse_response contando las respuestas inválidas."""
+        try:
+            return self.parse_response(data)
+        except Exception:
+            if metrics.enabled:
+                metrics.inc("q2_status_errors_total", server=f"{ip}:{port}")
+            raise
+
+    async def query_many(self, servers, timeout=None):
+        """
+        Consulta una lista de servidores [(ip, port), ...] usando un único socket UDP.
+        Es un generador asíncrono que entrega (server, state, error) en cuanto llega cada
+        respuesta; los servidores que no responden dentro de su timeout se entregan con
+        state=None y la excepción correspondiente en error. Sin timeout, cada servidor
+        tiene su propia espera según su RTT medido. Los servidores que resuelven a la
+        misma dirección se consultan una sola vez y todos reciben ese resultado.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _StatusProtocol(queue), family=socket.AF_INET)
+        packet = b'\xff\xff\xff\xff' + self.send_header.encode(self.encoding) + b'\x00'
+        pending = {}  # dirección -> ([servers], hora de envío, vencimiento)
+        try:
+            # Resolver nombres para poder asociar cada respuesta por su dirección de origen
+            for ip, port in servers:
+                server = (ip, port)
+                try:
+                    infos = await loop.getaddrinfo(ip, port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+                    address = infos[0][4][:2]
+                except OSError as e:
+                    yield server, None, Exception(f"No se pudo resolver {ip}: {e}")
+                    continue
+                if address in pending:
+                    pending[address][0].append(server)
+                    continue
+                wait = timeout if timeout is not None else self._timeout(ip, port)
+                transport.sendto(packet, address)
+                sent = loop.time()
+                pending[address] = ([server], sent, sent + wait)
+
+            while pending:
+                remaining = min(entry[2] for entry in pending.values()) - loop.time()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    ip, port, data = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    now = loop.time()
+                    for address in [a for a, entry in pending.items() if entry[2] <= now]:
+                        aliases = pending.pop(address)[0]
+                        server = aliases[0]
+                        rtt_table.timed_out(*server)
+                        if metrics.enabled:
+                            self._count_query(server[0], server[1], len(packet), timed_out=True)
+                        error = Exception("Tiempo de espera agotado al conectarse al servidor")
+                        for alias in aliases:
+                            yield alias, None, error
+                    continue
+                entry = pending.pop((ip, port), None)
+                if entry is None:
+                    # Respuesta duplicada, tardía o de un origen desconocido
+                    continue
+                aliases = entry[0]
+                server = aliases[0]
+                rtt = loop.time() - entry[1]
+                rtt_table.observe(server[0], server[1], rtt)
+                if metrics.enabled:
+                    self._count_query(server[0], server[1], len(packet), rtt, len(data))
+                try:
+                    state, error = self._parse_counted(data, *server), None
+                except Exception as e:
+                    state, error = None, e
+                for alias in aliases:
+                    yield alias, state, error
+        finally:
+            transport.close()
+
+    def parse_response(self, data):
+        """Interpreta el paquete de respuesta a 'status' y devuelve un ServerState con la info."""
         if len(data) < 4:
             raise Exception("Respuesta demasiado corta")
 
@@ -128,40 +718,39 @@ class Quake2Query:
         body = parts[1] if len(parts) > 1 else ""
 
         lines = body.splitlines()
-        state = {
-            "raw": {},
-            "players": [],
-            "bots": [],
-            "password": None,
-            "map": None,
-            "maxplayers": None,
-            "name": None,
-            "numplayers": 0,
-            "version": None
-        }
         if not lines:
-            return state
+            return ServerState()
 
         # La primera línea contiene la información del servidor en pares clave/valor
         info_line = lines[0]
         info_parts = info_line.split('\\')
         if info_parts and info_parts[0] == '':
             info_parts = info_parts[1:]
-        for i in range(0, len(info_parts) - 1, 2):
-            key = info_parts[i]
-            value = info_parts[i + 1]
-            state["raw"][key] = value
+        raw = RawInfo(zip(info_parts[::2], info_parts[1::2]))
 
         # Las siguientes líneas contienen la información de los jugadores
+        players = []
+        bots = []
         for line in lines[1:]:
             line = line.strip()
             if not line or line[0] == '\0':
                 break
+            if not self.is_quake1:
+                # Caso habitual: frags ping "nombre" ["dirección"], sin pasar por el tokenizador
+                match = _PLAYER_RE.fullmatch(line)
+                if match:
+                    frags, ping, name, address = match.groups()
+                    player = PlayerInfo(int(frags), int(ping), name, address)
+                    if player.ping:
+                        players.append(player)
+                    else:
+                        bots.append(player)
+                    continue
             args = self.parse_line_args(line)
             if not args:
                 continue
-            player = {}
             if self.is_quake1:
+                player = {}
                 try:
                     player["id"] = int(args[0])
                     player["score"] = int(args[1])
@@ -173,73 +762,59 @@ class Quake2Query:
                     player["color2"] = int(args[7])
                 except Exception as e:
                     print("Error parseando jugador (Quake1):", e)
+                player = Q1PlayerInfo(**player)
             else:
-                try:
-                    player["frags"] = int(args[0])
-                except:
-                    player["frags"] = 0
-                try:
-                    player["ping"] = int(args[1])
-                except:
-                    player["ping"] = 0
-                player["name"] = args[2] if len(args) > 2 and args[2] else ""
-                if not player["name"]:
-                    player.pop("name", None)
-                player["address"] = args[3] if len(args) > 3 and args[3] else ""
-                if not player["address"]:
-                    player.pop("address", None)
+                player = _parse_q2_player(args)
             # Según la lógica original, si el ping es 0 se considera bot
             if player.get("ping", 0):
-                state["players"].append(player)
+                players.append(player)
             else:
-                state["bots"].append(player)
-
-        if "g_needpass" in state["raw"]:
-            state["password"] = state["raw"]["g_needpass"]
-        if "mapname" in state["raw"]:
-            state["map"] = state["raw"]["mapname"]
-        if "sv_maxclients" in state["raw"]:
-            state["maxplayers"] = state["raw"]["sv_maxclients"]
-        if "maxclients" in state["raw"]:
-            state["maxplayers"] = state["raw"]["maxclients"]
-        if "sv_hostname" in state["raw"]:
-            state["name"] = state["raw"]["sv_hostname"]
-        if "hostname" in state["raw"]:
-            state["name"] = state["raw"]["hostname"]
-        if "clients" in state["raw"]:
-            state["numplayers"] = state["raw"]["clients"]
-        if "version" in state["raw"]:
-            state["version"] = state["raw"]["version"]
-        elif "iv" in state["raw"]:
-            state["version"] = state["raw"]["iv"]
+                bots.append(player)
+
+        state = ServerState(raw, players, bots)
+        if "g_needpass" in raw:
+            state.password = raw["g_needpass"]
+        if "mapname" in raw:
+            state.map = raw["mapname"]
+        if "sv_maxclients" in raw:
+            state.maxplayers = raw["sv_maxclients"]
+        if "maxclients" in raw:
+            state.maxplayers = raw["maxclients"]
+        if "sv_hostname" in raw:
+            state.name = raw["sv_hostname"]
+        if "hostname" in raw:
+            state.name = raw["hostname"]
+        if "clients" in raw:
+            state.numplayers = raw["clients"]
+        if "version" in raw:
+            state.version = raw["version"]
+        elif "iv" in raw:
+            state.version = raw["iv"]
         else:
-            state["numplayers"] = len(state["players"]) + len(state["bots"])
+            state.numplayers = len(players) + len(bots)
 
         return state
 
     def parse_line_args(self, line):
         """Parsea la línea de jugadores respetando las comillas."""
-        args = []
-        in_quote = False
-        current = ""
-        i = 0
-        while i < len(line):
-            c = line[i]
-            if c == '"':
-                in_quote = not in_quote
-                if not in_quote and current:
-                    args.append(current)
-                    current = ""
-                i += 1
-                continue
-            if c.isspace() and not in_quote:
-                if current:
-                    args.append(current)
-                    current = ""
-                i += 1
-            else:
-                current += c
-                i += 1
-        if current:
-            args.append(current)
-        return args
\ No newline at end of file
+        # Cada coincidencia es un texto sin comillas, o un prefijo pegado a un tramo
+        # entre comillas (que termina en la comilla de cierre o al final de la línea)
+        return [prefix + quoted or bare for prefix, quoted, bare in _ARG_RE.findall(line)
+                if prefix or quoted or bare]
+
+
+_ARG_RE = re.compile(r'([^\s"]*)"([^"]*)(?:"|\Z)|([^\s"]+)')
+_PLAYER_RE = re.compile(r'(-?\d+)\s+(-?\d+)\s+"([^"]+)"(?:\s+"([^"]+)")?')
+
+def _to_int(value):
+    """int() que devuelve 0 si el valor no es un número."""
+    try:
+        return int(value)
+    except ValueError:
+        return 0
+
+def _parse_q2_player(args):
+    """Convierte los campos de una línea de jugador de Quake II en un PlayerInfo."""
+    count = len(args)
+    return PlayerInfo(_to_int(args[0]), _to_int(args[1]) if count > 1 else 0,
+                      args[2] if count > 2 else None, args[3] if count > 3 else None)
@@ -3,9 +3,21 @@ by texnofobix
 MIT license
 """
 import threading as thread
+import hashlib
+import json
+import os
+import random
+import selectors
+from collections import deque
+from concurrent.futures import Future
 import socket
 import time
 
+from q2model import RconPlayer, intern
+from q2rtt import rtt_table
+from q2metrics import metrics
+from q2trace import tracer, traced
+
 REPORT_LINE = '--- ----- ---- --------------- ------- '
 REPORT_LINE += '--------------------- -------- ---'
 
@@ -26,13 +38,22 @@ class RConnection(object):
     _rconsendheader = b'\xFF\xFF\xFF\xFF'
     _rconsendstring = 'rcon {0} {1}'  # rcon command pattern
     _rconreplystring = '\xFF\xFF\xFF\xFFprint\n'  # rcon response header
+    _printheader = b'print\n'  # header repeated in every response packet
+    _encoding = 'utf-8'
     _badrcon_replies = [
         'Bad rconpassword.',
         'Invalid password.',
-        'print\nBad rcon_password.\n'
+        'print\nBad rcon_password.\n',
+        'Bad rcon_password.',
     ]
-    # custom timeouts
+    _gap_timeout = 0.1  # max idle time between packets of one response
+    # custom timeouts, used as floors over the estimated round trip time
     _long_commands_timeout = {'map': 5.0, 'fdir': 5.0, 'dir maps/': 5.0}
+    # commands whose output may come in bursts, they keep the long gap
+    _bursty_commands = ('map',)
+    _rtt_table = rtt_table  # per server round trip time estimates
+    # known response endings, used to return before the gap timer expires
+    _response_terminators = {'status': '\n\n'}
 
     def __init__(self, host, port, password=None):
         """
@@ -45,6 +66,9 @@ class RConnection(object):
         self.port = port
         self.password = password
         self.lock = thread.Lock()
+        # held for a whole command, so replies of concurrent commands
+        # sent through the same socket can not be mixed up
+        self.io_lock = thread.RLock()
         self.socket = socket.socket(type=socket.SOCK_DGRAM)
         self.socket.connect((self.host, self.port))
         self.test_password()
@@ -98,47 +122,152 @@ class RConnection(object):
     def test_password(self):
         """
         Test the RCON connection
-        :raise RconError: When an invalid RCON password is supplied
+        :raise RconError: When an invalid RCON password is supplied or the
+                          server does not answer
         """
         response = self.send('status')
-        if response in self._badrcon_replies:
+        if isinstance(response, RconError):
+            raise response
+        if self._bad_password(response):
             self._password = None
             raise RconError('bad rcon password supplied')
         return True
 
-    def _recvall(self, timeout=0.5):
+    def _bad_password(self, response):
+        """
+        Check whether a response is the server rejecting the password
+        :param response: The response to a command, with or without header
+        :return bool: True when the password was rejected
+        """
+        reply = response.strip()
+        return any(reply == bad.strip() for bad in self._badrcon_replies)
+
+    def _packets(self, timeout, gap, limit=None):
+        """
+        Yield response packets, with the 4 byte header stripped out
+        :param timeout: The time to wait for the first packet
+        :param gap: The max idle time between consequent packets
+        :param limit: An absolute time.monotonic() deadline for all packets
+        """
+        self.socket.setblocking(False)
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.socket, selectors.EVENT_READ)
+            deadline = time.monotonic() + timeout
+            while True:
+                if limit is not None:
+                    deadline = min(deadline, limit)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    return
+
+                try:
+                    data = self.socket.recv(4096)
+                except BlockingIOError:
+                    continue
+                except socket.error:
+                    return
+
+                if metrics.enabled:
+                    metrics.inc('q2_bytes_received_total', len(data),
+                                server=self._metrics_label())
+                chunk = memoryview(data)[4:]
+                if chunk:
+                    yield chunk
+                    deadline = time.monotonic() + gap
+
+    def _recvall(self, timeout=0.5, gap=None, terminator=None, first=None,
+                 observe=False):
         """
         Receive the RCON command response
-        :param timeout: The timeout between consequent data receive
+        :param timeout: The time to wait for the first packet is twice this
+        :param gap: The max idle time between consequent packets
+        :param terminator: A response ending that marks it as complete
+        :param first: The time to wait for the first packet, overrides timeout
+        :param observe: Feed the first packet delay to the RTT estimator
         :return str: The RCON command response with header stripped out
         """
-        response = ''
+        if gap is None:
+            gap = min(self._gap_timeout, timeout)
+        if first is None:
+            first = timeout * 2
+        if terminator:
+            terminator = terminator.encode(self._encoding)
+        # packets are kept as views and joined once, then decoded once, so a
+        # multi-byte character split across datagrams is decoded correctly
+        chunks = []
+        tail = b''
+        # phases for q2trace: waiting for the first packet, then the rest
+        tracing = tracer.enabled
+        started = time.perf_counter() if tracing else 0
+        first_at = None
+        for chunk in self._packets(first, gap):
+            if tracing and first_at is None:
+                first_at = time.perf_counter()
+            if observe and not chunks:
+                self._rtt_table.observe(self.host, self.port,
+                                        time.monotonic() - self._sent_at)
+            if chunks and chunk[:6] == self._printheader:
+                # every packet of a long reply repeats the print header
+                chunk = chunk[6:]
+            if chunk:
+                chunks.append(chunk)
+                if terminator:
+                    tail = (tail + chunk)[-len(terminator):]
+                    if tail == terminator:
+                        break
+
+        if not chunks:
+            if observe:
+                self._rtt_table.timed_out(self.host, self.port)
+            if metrics.enabled:
+                metrics.inc('q2_rcon_timeouts_total',
+                            server=self._metrics_label())
+        if tracing:
+            ended = time.perf_counter()
+            tracer.record('rcon.first_byte', started, first_at or ended,
+                          timeout=first, received=first_at is not None)
+            if first_at is not None:
+                tracer.record('rcon.rest', first_at, ended, gap=gap,
+                              packets=len(chunks))
+        with tracer.span('rcon.decode'):
+            return self._decode(b''.join(chunks))
+
+    def _metrics_label(self):
+        return '{0}:{1}'.format(self.host, self.port)
+
+    def _drain(self):
+        """
+        Discard late packets left over from previous commands
+        :return int: The number of packets discarded
+        """
         self.socket.setblocking(False)
-        start = time.time()
+        discarded = 0
         while True:
-            if response and time.time() - start > timeout:
-                break
-            elif time.time() - start > timeout * 2:
-                break
-
             try:
-                data = self.socket.recv(4096)[4:]
-                if data:
-                    response += data.decode('utf-8')
-                    start = time.time()
-                else:
-                    time.sleep(0.1)
+                self.socket.recv(4096)
+            except BlockingIOError:
+                return discarded
             except socket.error:
-                pass
+                # e.g. ICMP port unreachable from an earlier send
+                return discarded
+            discarded += 1
 
-        return response
+    def _decode(self, data):
+        """
+        Decode a full response, falling back to latin-1 for non UTF-8 text
+        :param data: The response bytes
+        :return str: The decoded response
+        """
+        try:
+            return data.decode(self._encoding)
+        except UnicodeDecodeError:
+            return data.decode('latin-1')
 
-    def send(self, data):
+    def _sendcommand(self, data):
         """
-        Send a command over the socket. If password is set use rcon
+        Format a command as rcon if a password is set and send it
         :param data: The command to send
-        :raise RconError: When it's not possible to evaluate the command
-        :return str: The server response to the RCON command
+        :raise RconError: When it's not possible to send the command
         """
         try:
             if not data:
@@ -146,15 +275,115 @@ class RConnection(object):
             with self.lock:
                 if self.password != '':
                     data = self._rconsendstring.format(self.password, data)
-            self.socket.send(self._rconsendheader + bytes(data, 'utf-8'))
+            packet = self._rconsendheader + bytes(data, 'utf-8')
+            self.socket.send(packet)
+            self._sent_at = time.monotonic()
+            if metrics.enabled:
+                metrics.inc('q2_bytes_sent_total', len(packet),
+                            server=self._metrics_label())
         except socket.error as e:
-            raise RconError(e.message, e)
-        else:
-            timeout = self._timeout
-            command = data.split(' ')[0]
-            if command in self._long_commands_timeout:
-                timeout = self._long_commands_timeout[command]
-            return self._recvall(timeout=timeout)
+            raise RconError(str(e), e)
+
+    def send(self, data):
+        """
+        Send a command over the socket. If password is set use rcon
+        :param data: The command to send
+        :raise RconError: When it's not possible to evaluate the command
+        :return str: The server response to the RCON command
+        """
+        with self.io_lock:
+            # late replies to an earlier command would be taken as this one's
+            self._drain()
+            with tracer.span('rcon.send', server=self._metrics_label(),
+                             command=data):
+                self._sendcommand(data)
+            response = self._recvall(**self._recv_options(data))
+        if metrics.enabled:
+            server = self._metrics_label()
+            metrics.inc('q2_rcon_commands_total', server=server)
+            metrics.observe('q2_rcon_seconds',
+                            time.monotonic() - self._sent_at, server=server)
+        return response
+
+    def send_batch(self, commands, timeout=5.0):
+        """
+        Send several commands back to back and split the merged replies.
+        Every command is followed by an 'echo <marker>' whose output marks
+        where that command's response ends, so no idle gap is waited for.
+        :param commands: The commands to send, in order
+        :param timeout: The max time to wait for the whole batch
+        :raise RconError: When it's not possible to send the commands
+        :return list: The response of each command; None when its marker
+                      never came back (its output then goes to the next one)
+        """
+        commands = list(commands)
+        if not commands:
+            return []
+        with self.io_lock:
+            return self._send_batch(commands, timeout)
+
+    def _send_batch(self, commands, timeout):
+        """
+        Body of send_batch, run while holding the socket
+        """
+        nonce = '{0:016x}'.format(random.getrandbits(64))
+        markers = ['{0}:{1}\n'.format(nonce, i).encode() for i in range(len(commands))]
+        self._drain()
+        for command, marker in zip(commands, markers):
+            self._sendcommand(command)
+            self._sendcommand('echo ' + marker.decode().strip())
+        if metrics.enabled:
+            metrics.inc('q2_rcon_commands_total', len(commands),
+                        server=self._metrics_label())
+
+        buffer = bytearray()
+        last = markers[-1]
+        limit = time.monotonic() + timeout
+        for chunk in self._packets(timeout, timeout, limit=limit):
+            if chunk[:6] == self._printheader:
+                chunk = chunk[6:]
+            buffer += chunk
+            if buffer.endswith(last):
+                break
+
+        results = []
+        start = 0
+        for marker in markers:
+            end = buffer.find(marker, start)
+            if end < 0:
+                results.append(None)
+                continue
+            results.append(self._decode(bytes(buffer[start:end])))
+            start = end + len(marker)
+        return results
+
+    def _recv_options(self, command):
+        """
+        Pick the receive timeouts for a command from the server RTT estimate
+        :param command: The command being sent, without the rcon prefix
+        :return dict: The keyword arguments for _recvall
+        """
+        rtt = self._rtt_table
+        gap = rtt.gap(self.host, self.port, self._gap_timeout)
+        options = {
+            'first': rtt.timeout(self.host, self.port, self._timeout * 2),
+            'gap': gap,
+            'observe': True,
+        }
+        for name, timeout in self._long_commands_timeout.items():
+            if command == name or command.startswith(name + ' '):
+                # the server may take a while before answering these, so
+                # their RTT is not sampled and their timeout is a floor
+                options = {
+                    'first': rtt.timeout(self.host, self.port, timeout * 2,
+                                         floor=timeout),
+                    'gap': timeout if name in self._bursty_commands else gap,
+                }
+                break
+        terminator = self._response_terminators.get(command.strip())
+        if terminator:
+            options['terminator'] = terminator
+        return options
 
 
 class Q2Exception(RconError):
@@ -185,14 +414,23 @@ class Q2RConnection(RConnection):
 
         return response[6:]
 
+    @traced('rcon.get_status')
     def get_status(self):
         """
         Send a RCON command over the socket
         :raise Q2Exception: When it's not possible to evaluate the command
         :return str: The server response to the RCON command
         """
-        playerinfo = False
         output = self.send('status')
+        with tracer.span('rcon.parse_status'):
+            self._parse_status(output)
+
+    def _parse_status(self, output):
+        """
+        Parse the status response into current_map and players
+        :param output: The server response to 'status'
+        """
+        playerinfo = False
         self.current_map = ''
         self.players = []
 
@@ -201,44 +439,47 @@ class Q2RConnection(RConnection):
             #print("line",line)
             if playerinfo and line[0:3].strip(' ') != '':
                 self.players.append(
-                        {
-                            line[0:3].strip():
-                            {
-                                'score': int(line[5:9]),
-                                'ping': line[10:14].strip(),
-                                'name': line[15:29].strip(),
-                                'lastmsg': int(line[31:38]),
-                                'ip_address': line[39:59].strip(),
-                                'rate_pps': line[60:69].strip(),
-                                'ver': int(line[70:73]),
-                            }
-                        }
+                        RconPlayer(
+                            num=line[0:3].strip(),
+                            score=int(line[5:9]),
+                            ping=line[10:14].strip(),
+                            name=line[15:29].strip(),
+                            lastmsg=int(line[31:38]),
+                            ip_address=line[39:59].strip(),
+                            rate_pps=line[60:69].strip(),
+                            ver=int(line[70:73]),
+                        )
                 )
 
             if line[0:3] == 'map' and self.current_map == '':
-                self.current_map = line.split(': ')[1]
+                self.current_map = intern(line.split(': ')[1])
 
             if line == REPORT_LINE:
                 playerinfo = True
 
+    @traced('rcon.get_map_list')
     def get_map_list(self):
         """
         Get all maps
         :return list: Get all maps
         """
-        output = self.send('dir maps/')
-        lines = output.splitlines()
-        self.maplist = []
+        self.maplist = self.parse_map_list(self.send('dir maps/'))
+        return self.maplist
 
-        for line in lines:
+    @staticmethod
+    def parse_map_list(output):
+        """
+        Parse the 'dir maps/' response
+        :param output: The server response to 'dir maps/'
+        :return list: The sorted map names, without duplicates
+        """
+        maps = set()
+        for line in output.splitlines():
             sline = line.strip()
 
             if not (sline == '----' or sline[0:13] == 'Directory of '):
-                self.maplist.append(line.split(".")[0])
-
-        self.maplist = list(set(self.maplist))
-        self.maplist.sort()
-        return self.maplist
+                maps.add(line.split(".")[0])
+        return sorted(maps)
 
     def change_map(self, map_name):
         """
@@ -257,6 +498,7 @@ class Q2RConnection(RConnection):
         """
         return self._parse_serverinfo(self.send('serverinfo'))
 
+    @traced('rcon.parse_serverinfo')
     def _parse_serverinfo(self, data):
         """
         Parse serverinfo response
@@ -267,3 +509,451 @@ class Q2RConnection(RConnection):
                 line = list(filter(lambda x: x != '', line.split(' ')))
                 self.serverinfo[line[0]] = line[1]
         return self.serverinfo
+
+
+class Q2RConnectionPool(object):
+    """
+    Registry of live Q2RConnection sessions keyed by host:port, so every
+    command does not pay for a new socket and a password test
+    """
+    _idle_check = 60.0  # idle seconds after which a session is re-tested
+
+    def __init__(self, connection_class=Q2RConnection):
+        self.connection_class = connection_class
+        self.lock = thread.Lock()
+        self._sessions = {}  # host:port -> [connection, last used time]
+        # host:port -> lock held while a session is validated or opened, so
+        # two threads never open (and leak) two sessions for one server
+        self._opening = {}
+
+    @staticmethod
+    def _key(host, port):
+        return '{0}:{1}'.format(host.strip(), int(port))
+
+    def get(self, host, port, password=None):
+        """
+        Get a validated session, opening one if needed
+        :param host: The ip/domain of the server
+        :param port: The rcon port of the server
+        :param password: The RCON password
+        :raise RconError: When the session can not be opened or validated
+        :return Q2RConnection: The live session
+        """
+        key = self._key(host, port)
+        with self.lock:
+            opening = self._opening.setdefault(key, thread.Lock())
+        with opening:
+            with self.lock:
+                entry = self._sessions.get(key)
+            if entry is not None:
+                conn, last_used = entry
+                if conn.password != (password or '').strip():
+                    self.drop(host, port)
+                    entry = None
+                elif time.monotonic() - last_used > self._idle_check:
+                    try:
+                        conn.test_password()
+                    except (RconError, socket.error):
+                        self.drop(host, port)
+                        entry = None
+            if entry is None:
+                conn = self.connection_class(host=host, port=port,
+                                             password=password)
+                with self.lock:
+                    self._sessions[key] = [conn, time.monotonic()]
+        return conn
+
+    def send(self, host, port, password, data):
+        """
+        Send a command through the pooled session of a server
+        :param data: The command to send
+        :raise RconError: When it's not possible to evaluate the command
+        :return str: The server response to the RCON command
+        """
+        conn = self.get(host, port, password)
+        try:
+            response = conn.send(data)
+        except (RconError, socket.error):
+            self.drop(host, port)
+            raise
+        if isinstance(response, RconError):
+            # no reply: the session may be stale, open a new one next time
+            self.drop(host, port)
+        elif conn._bad_password(response):
+            # the password was changed on the server since the session opened
+            self.drop(host, port)
+            raise RconError('bad rcon password supplied')
+        else:
+            with self.lock:
+                entry = self._sessions.get(self._key(host, port))
+                if entry is not None:
+                    entry[1] = time.monotonic()
+        return response
+
+    def drop(self, host, port):
+        """
+        Forget the session of a server and close its socket
+        """
+        with self.lock:
+            entry = self._sessions.pop(self._key(host, port), None)
+        if entry is not None:
+            try:
+                entry[0].socket.close()
+            except (AttributeError, socket.error):
+                pass
+
+    def close(self):
+        """
+        Close every session
+        """
+        with self.lock:
+            keys = list(self._sessions)
+        for key in keys:
+            host, port = key.rsplit(':', 1)
+            self.drop(host, port)
+
+
+class RconBusy(RconError):
+    """Raised when a server already has too many commands waiting"""
+
+
+class RconExecutor(object):
+    """
+    Fixed pool of worker threads running RCON commands through a
+    Q2RConnectionPool. Every server has its own FIFO queue: commands for
+    one server run strictly in order, one at a time, while different
+    servers run in parallel. Queues are bounded, so a flood of commands
+    is refused up front instead of piling up threads. Broadcasts have
+    their own worker budget, so a broadcast to many (maybe dead) servers
+    neither runs a few servers at a time nor delays the other commands
+    """
+
+    def __init__(self, pool, max_workers=4, max_pending=16,
+                 broadcast_workers=32):
+        self.pool = pool
+        self.max_workers = max_workers
+        self.max_pending = max_pending  # queued commands per server
+        self.broadcast_workers = broadcast_workers
+        self._cond = thread.Condition()
+        self._queues = {}  # host:port -> deque of (future, args, broadcast)
+        self._ready = deque()  # servers with queued work and no running command
+        self._running = {}  # host:port -> broadcast flag of its running command
+        self._workers = []
+        self._shutdown = False
+
+    def submit(self, host, port, password, data, callback=None):
+        """
+        Queue a command for a server
+        :param data: The command to send
+        :param callback: Called as callback(response, error) when the command
+                         finishes or is cancelled, from the thread doing it
+        :raise RconBusy: When the server queue is full
+        :return Future: The pending command, it can be cancelled while queued
+        """
+        return self._submit(host, port, password, data, callback, False)
+
+    def _submit(self, host, port, password, data, callback, broadcast):
+        key = Q2RConnectionPool._key(host, port)
+        future = Future()
+        if callback:
+            def done(f):
+                if f.cancelled():
+                    callback(None, RconError('command cancelled'))
+                    return
+                error = f.exception()
+                callback(None if error else f.result(), error)
+            future.add_done_callback(done)
+        with self._cond:
+            if self._shutdown:
+                raise RconError('executor is shut down')
+            queue = self._queues.setdefault(key, deque())
+            if len(queue) >= self.max_pending:
+                raise RconBusy('{0} commands already queued for {1}'.format(
+                    len(queue), key))
+            queue.append((future, (host, port, password, data), broadcast))
+            if key not in self._running and len(queue) == 1:
+                self._ready.append(key)
+            if len(self._workers) < self.max_workers + self.broadcast_workers \
+                    and len(self._ready) > self._idle_workers():
+                self._start_worker()
+            self._cond.notify()
+        return future
+
+    def broadcast(self, servers, data, callback=None):
+        """
+        Queue the same command for many servers. Up to broadcast_workers
+        servers are contacted at the same time, apart from max_workers
+        :param servers: An iterable of (host, port, password)
+        :param data: The command to send
+        :param callback: Called as callback((host, port), response, error) as
+                         each server completes, from the thread doing it
+        :return Future: Resolves, once every server is done, to a dict with
+                        'ok' and 'failed' counts plus 'results', mapping each
+                        (host, port) to its response or its exception.
+                        Servers with a full queue count as failed (RconBusy)
+        """
+        servers = list(servers)
+        summary = {'ok': 0, 'failed': 0, 'results': {}}
+        result = Future()
+        lock = thread.Lock()
+        left = len(servers)
+
+        def finished(server, response, error):
+            nonlocal left
+            if callback:
+                callback(server, response, error)
+            with lock:
+                summary['failed' if error else 'ok'] += 1
+                summary['results'][server] = error or response
+                left -= 1
+                last = left == 0
+            if last:
+                result.set_result(summary)
+
+        if not servers:
+            result.set_result(summary)
+        for host, port, password in servers:
+            server = (host, port)
+            try:
+                self._submit(host, port, password, data,
+                             lambda response, error, server=server:
+                             finished(server, response, error), True)
+            except RconError as e:
+                finished(server, None, e)
+        return result
+
+    def pending(self, host, port):
+        """
+        :return int: Number of commands queued (not running) for a server
+        """
+        with self._cond:
+            return len(self._queues.get(Q2RConnectionPool._key(host, port), ()))
+
+    def cancel(self, host, port):
+        """
+        Cancel every queued command of a server; the running one finishes
+        :return int: Number of commands cancelled
+        """
+        key = Q2RConnectionPool._key(host, port)
+        with self._cond:
+            queue = self._queues.pop(key, deque())
+            if key in self._ready:
+                self._ready.remove(key)
+        cancelled = 0
+        for future, _, _ in queue:
+            if future.cancel():
+                cancelled += 1
+        return cancelled
+
+    def shutdown(self, wait=True):
+        """
+        Cancel queued commands and stop the workers
+        """
+        with self._cond:
+            self._shutdown = True
+            keys = list(self._queues)
+        for key in keys:
+            host, port = key.rsplit(':', 1)
+            self.cancel(host, port)
+        with self._cond:
+            self._cond.notify_all()
+            workers = list(self._workers)
+        if wait:
+            for worker in workers:
+                worker.join()
+
+    def _idle_workers(self):
+        return len(self._workers) - len(self._running)
+
+    def _start_worker(self):
+        worker = thread.Thread(target=self._work, daemon=True)
+        self._workers.append(worker)
+        worker.start()
+
+    def _has_slot(self, broadcast):
+        """
+        :return bool: Whether one more command of this kind may run now
+        """
+        limit = self.broadcast_workers if broadcast else self.max_workers
+        busy = sum(1 for running in self._running.values() if running == broadcast)
+        return busy < limit
+
+    def _next(self):
+        """
+        Wait for a server with queued work whose kind of command has a free
+        slot, and take its oldest command
+        :return tuple: (key, future, args), or None on shutdown
+        """
+        with self._cond:
+            while True:
+                for key in list(self._ready):
+                    queue = self._queues.get(key)
+                    if not queue:
+                        self._ready.remove(key)
+                        continue
+                    broadcast = queue[0][2]
+                    if not self._has_slot(broadcast):
+                        continue
+                    self._ready.remove(key)
+                    future, args, _ = queue.popleft()
+                    if not queue:
+                        del self._queues[key]
+                    self._running[key] = broadcast
+                    return key, future, args
+                if self._shutdown:
+                    return None
+                self._cond.wait()
+
+    def _work(self):
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            key, future, args = job
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        response = self.pool.send(*args)
+                        if isinstance(response, RconError):
+                            raise response
+                    except Exception as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(response)
+            finally:
+                with self._cond:
+                    del self._running[key]
+                    # the next command of this server goes behind other servers
+                    if self._queues.get(key):
+                        self._ready.append(key)
+                    # a slot is free again, a waiting worker may take it
+                    if self._ready:
+                        self._cond.notify()
+
+
+class MapListCache(object):
+    """
+    Per-server map lists, persisted on disk. Lookups return the cached list
+    right away; lists older than ttl are revalidated in the background with
+    'dir maps/', and only re-parsed and saved when the response fingerprint
+    (a hash of the raw listing) changes
+    """
+
+    def __init__(self, pool, path=None, ttl=3600.0):
+        self.pool = pool
+        self.path = path
+        self.ttl = ttl
+        self.lock = thread.Lock()
+        self._entries = {}  # host:port -> {'maps', 'fingerprint', 'checked'}
+        self._refreshing = {}  # host:port -> pending callbacks
+        self._dirty = False
+
+    @staticmethod
+    def _fingerprint(output):
+        return hashlib.sha1(output.encode('utf-8', 'replace')).hexdigest()
+
+    def get(self, host, port, password=None, callback=None):
+        """
+        Get the cached map list, revalidating it in the background if needed
+        :param host: The ip/domain of the server
+        :param port: The rcon port of the server
+        :param password: The RCON password, needed for the revalidation
+        :param callback: Called as callback(maps, error) from a worker thread
+                         once a revalidation finishes (only when one runs)
+        :return list: The cached map list, or None if it is not known yet
+        """
+        key = Q2RConnectionPool._key(host, port)
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry['checked'] < self.ttl:
+                return entry['maps']
+            callbacks = self._refreshing.get(key)
+            start = callbacks is None
+            if start:
+                callbacks = self._refreshing[key] = []
+            if callback:
+                callbacks.append(callback)
+        if start:
+            thread.Thread(target=self._refresh, args=(host, port, password),
+                          daemon=True).start()
+        return entry['maps'] if entry else None
+
+    def refresh(self, host, port, password=None):
+        """
+        Fetch the map list from the server now
+        :raise RconError: When the server does not answer or does not reply
+                          with a directory listing
+        :return tuple: (maps, changed) where changed tells whether the
+                       listing differs from the cached one
+        """
+        output = self.pool.send(host, port, password, 'dir maps/')
+        if isinstance(output, RconError):
+            raise output
+        if not output.lstrip().startswith('Directory of '):
+            # an error message, not a listing: never cache it
+            raise RconError('unexpected reply to dir maps/: {0}'.format(
+                output.strip()[:80]))
+        key = Q2RConnectionPool._key(host, port)
+        fingerprint = self._fingerprint(output)
+        with self.lock:
+            entry = self._entries.get(key)
+            changed = entry is None or entry['fingerprint'] != fingerprint
+        if changed:
+            entry = {'maps': Q2RConnection.parse_map_list(output),
+                     'fingerprint': fingerprint}
+        entry = dict(entry, checked=time.time())
+        with self.lock:
+            self._entries[key] = entry
+            self._dirty = True
+        if changed:
+            self.save()
+        return entry['maps'], changed
+
+    def _refresh(self, host, port, password):
+        maps, error = None, None
+        try:
+            maps = self.refresh(host, port, password)[0]
+        except Exception as e:
+            error = e
+        with self.lock:
+            callbacks = self._refreshing.pop(
+                Q2RConnectionPool._key(host, port), [])
+        for callback in callbacks:
+            callback(maps, error)
+
+    def load(self, path=None):
+        """
+        Load the map lists saved by a previous run, if any
+        """
+        self.path = path or self.path
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            entries = {
+                key: {'maps': list(e['maps']), 'fingerprint': e['fingerprint'],
+                      'checked': float(e['checked'])}
+                for key, e in data.items()
+            }
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            print('Could not read the map list cache:', e)
+            return
+        with self.lock:
+            self._entries.update(entries)
+
+    def save(self, path=None):
+        """
+        Write the map lists to disk if anything changed since the last save
+        """
+        path = path or self.path
+        with self.lock:
+            if not path or not self._dirty:
+                return
+            data = dict(self._entries)
+            self._dirty = False
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+        except OSError as e:
+            print('Could not write the map list cache:', e)
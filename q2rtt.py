@@ -0,0 +1,109 @@
+#################################################################
+# Estimación de RTT por servidor y timeouts adaptativos         #
+#################################################################
+# Mismo estimador que TCP (RFC 6298): un RTT suavizado (srtt) y su
+# variación (rttvar) por host:puerto. De ahí salen los timeouts de las
+# consultas y el tiempo de espera entre paquetes de una respuesta.
+import json
+import os
+import threading
+
+class RttTable:
+    alpha = 1 / 8
+    beta = 1 / 4
+    min_timeout = 0.1  # nunca esperar menos que esto la primera respuesta
+    min_gap = 0.02  # ni menos que esto entre paquetes de una misma respuesta
+    max_gap = 1.0
+    max_backoff = 8
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = {}  # "host:puerto" -> [srtt, rttvar, backoff, última medición]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(host, port):
+        return f"{host}:{int(port)}"
+
+    def observe(self, host, port, rtt):
+        """Agrega una medición de RTT (en segundos) del servidor."""
+        key = self._key(host, port)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [rtt, rtt / 2, 1, rtt]
+                return
+            srtt, rttvar = entry[0], entry[1]
+            rttvar = (1 - self.beta) * rttvar + self.beta * abs(srtt - rtt)
+            srtt = (1 - self.alpha) * srtt + self.alpha * rtt
+            self._entries[key] = [srtt, rttvar, 1, rtt]
+
+    def timed_out(self, host, port):
+        """El servidor no respondió a tiempo: se duplica su timeout (hasta max_backoff veces)."""
+        with self._lock:
+            entry = self._entries.get(self._key(host, port))
+            if entry is not None:
+                entry[2] = min(entry[2] * 2, self.max_backoff)
+
+    def get(self, host, port):
+        """(srtt, rttvar) del servidor, o None si todavía no hay mediciones."""
+        with self._lock:
+            entry = self._entries.get(self._key(host, port))
+        return (entry[0], entry[1]) if entry else None
+
+    def last(self, host, port):
+        """Última medición de RTT del servidor, o None."""
+        with self._lock:
+            entry = self._entries.get(self._key(host, port))
+        return entry[3] if entry else None
+
+    def timeout(self, host, port, default, floor=0.0, ceiling=None):
+        """
+        Espera para la primera respuesta: srtt + 4 * rttvar (con el backoff por
+        timeouts), sin bajar de floor ni pasar de ceiling. Sin mediciones: default.
+        """
+        with self._lock:
+            entry = self._entries.get(self._key(host, port))
+        if entry is None:
+            return max(default, floor)
+        srtt, rttvar, backoff = entry[:3]
+        value = max((srtt + 4 * rttvar) * backoff, self.min_timeout, floor)
+        return min(value, ceiling) if ceiling is not None else value
+
+    def gap(self, host, port, default):
+        """Espera máxima entre paquetes de una misma respuesta, según la variación del RTT."""
+        estimate = self.get(host, port)
+        if estimate is None:
+            return default
+        return min(4 * estimate[1] + self.min_gap, self.max_gap)
+
+    def load(self, path=None):
+        """Carga las estimaciones guardadas en disco (si existen)."""
+        self.path = path or self.path
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            with self._lock:
+                for key, (srtt, rttvar) in data.items():
+                    self._entries[key] = [float(srtt), float(rttvar), 1, float(srtt)]
+        except (OSError, ValueError, TypeError) as e:
+            print("Error al leer las estimaciones de RTT:", e)
+
+    def save(self, path=None):
+        """Guarda las estimaciones en disco para la próxima ejecución."""
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            data = {key: [round(e[0], 6), round(e[1], 6)] for key, e in self._entries.items()}
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        except OSError as e:
+            print("Error al guardar las estimaciones de RTT:", e)
+
+
+# Tabla compartida por q2query y q2rcon
+rtt_table = RttTable()
@@ -0,0 +1,132 @@
+#################################################################
+# Índice de jugadores de todos los servidores                   #
+#################################################################
+# Responde "¿dónde está X?" con los últimos 'status' recibidos, sin
+# consultar la red. Los nombres se normalizan (colores y caracteres
+# altos de Quake) y se indexan por trigramas para buscar subcadenas,
+# y en una lista ordenada para buscar por prefijo.
+import bisect
+import re
+import threading
+
+# Códigos de color estilo ^1 que usan algunos mods y clientes
+_COLOR_RE = re.compile(r"\^[0-9a-zA-Z]")
+
+# Caracteres bajos de la fuente de Quake que se ven como texto normal
+_CONCHARS = {0x10: "[", 0x11: "]", 0x1c: ".", 0x1d: "-", 0x1e: "-", 0x1f: "-"}
+_CONCHARS.update({0x12 + i: str(i) for i in range(10)})
+
+def _plain_char(code):
+    code &= 0x7f  # con el bit alto la fuente dibuja la misma letra en otro color
+    if code < 0x20:
+        return _CONCHARS.get(code, "")
+    return chr(code)
+
+_PLAIN = {code: _plain_char(code) for code in range(256)}
+
+def normalize_name(name):
+    """Nombre tal como se lee en pantalla, sin colores y en minúsculas, para comparar."""
+    name = name.translate(_PLAIN)
+    return _COLOR_RE.sub("", name).strip().casefold()
+
+def _grams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class PlayerIndex:
+    """
+    Índice invertido nombre -> servidores. update() recibe cada 'status' y sólo
+    agrega o quita los jugadores que cambiaron en ese servidor.
+    """
+    def __init__(self):
+        self._servers = {}  # (ip, port) -> {nombre normalizado: nombre original}
+        self._names = {}  # nombre normalizado -> {(ip, port): nombre original}
+        self._grams = {}  # trigrama -> nombres normalizados que lo contienen
+        self._sorted = []  # nombres normalizados ordenados (búsqueda por prefijo)
+        self._lock = threading.Lock()
+
+    def update(self, server, state):
+        """Reemplaza los jugadores conocidos de server por los de state (un ServerState)."""
+        players = {}
+        for player in list(state["players"]) + list(state["bots"]):
+            name = player.get("name")
+            key = normalize_name(name) if name else ""
+            if key:
+                players[key] = name
+        with self._lock:
+            old = self._servers.get(server, {})
+            for key in old.keys() - players.keys():
+                self._remove(key, server)
+            for key, name in players.items():
+                self._add(key, server, name)
+            if players:
+                self._servers[server] = players
+            else:
+                self._servers.pop(server, None)
+
+    def remove(self, server):
+        """Olvida los jugadores de un servidor (por ejemplo si dejó de estar en la lista)."""
+        with self._lock:
+            for key in self._servers.pop(server, {}):
+                self._remove(key, server)
+
+    def _add(self, key, server, name):
+        entry = self._names.get(key)
+        if entry is None:
+            entry = self._names[key] = {}
+            bisect.insort(self._sorted, key)
+            for gram in _grams(key):
+                self._grams.setdefault(gram, set()).add(key)
+        entry[server] = name
+
+    def _remove(self, key, server):
+        entry = self._names.get(key)
+        if entry is None:
+            return
+        entry.pop(server, None)
+        if entry:
+            return
+        del self._names[key]
+        i = bisect.bisect_left(self._sorted, key)
+        if i < len(self._sorted) and self._sorted[i] == key:
+            del self._sorted[i]
+        for gram in _grams(key):
+            keys = self._grams.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._grams[gram]
+
+    def search(self, text, limit=50):
+        """
+        Jugadores cuyo nombre contiene text: [(nombre, (ip, port)), ...], primero los
+        que empiezan con text y luego en orden alfabético.
+        """
+        query = normalize_name(text)
+        if not query:
+            return []
+        with self._lock:
+            i = bisect.bisect_left(self._sorted, query)
+            prefix = []
+            while i < len(self._sorted) and self._sorted[i].startswith(query):
+                prefix.append(self._sorted[i])
+                i += 1
+            if len(query) >= 3:
+                # Candidatos: los nombres que tienen todos los trigramas de la búsqueda
+                sets = sorted((self._grams.get(g, set()) for g in _grams(query)), key=len)
+                candidates = set.intersection(*sets) if sets[0] else set()
+            else:
+                candidates = self._names.keys()
+            prefixed = set(prefix)
+            inner = sorted(k for k in candidates if k not in prefixed and query in k)
+            results = []
+            for key in prefix + inner:
+                for server, name in sorted(self._names[key].items()):
+                    results.append((name, server))
+                    if len(results) >= limit:
+                        return results
+            return results
+
+    def __len__(self):
+        with self._lock:
+            return len(self._names)
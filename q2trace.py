@@ -0,0 +1,193 @@
+#################################################################
+# Trazas por fase de las consultas y comandos RCON              #
+#################################################################
+# Desactivado por defecto. Con tracer.enable() cada fase (resolución,
+# envío, espera del primer paquete, resto de la respuesta, decodificación,
+# parseo) se registra como un intervalo con su duración; los intervalos
+# se entregan a los hooks registrados y se pueden guardar en el formato
+# de trazas de Chrome (chrome://tracing o https://ui.perfetto.dev).
+# Las funciones marcadas con @traced además pueden perfilarse con cProfile
+# (tracer.enable(profile=True)) para ver qué hay dentro de una fase lenta.
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class _NullSpan:
+    """Intervalo que no hace nada: lo que devuelve span() con las trazas apagadas."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return False
+
+    def set(self, **args):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is not None:
+            self.args["error"] = type.__name__
+        self.tracer.record(self.name, self.start, time.perf_counter(), **self.args)
+        return False
+
+    def set(self, **args):
+        """Agrega datos al intervalo (por ejemplo bytes recibidos)."""
+        self.args.update(args)
+
+
+class Tracer:
+    """
+    Junta los intervalos medidos. Guarda los últimos max_events en memoria para
+    exportarlos y además llama a cada hook(name, start, duration, args) al cerrarse
+    un intervalo (start y duration en segundos de time.perf_counter()).
+    """
+    def __init__(self, max_events=100000):
+        self.enabled = False
+        self._events = deque(maxlen=max_events)  # (name, start, end, tid, args)
+        self._hooks = []
+        self._origin = time.perf_counter()
+        self.profiling = False
+        self._profile_stats = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def enable(self, profile=False):
+        self.enabled = True
+        self.profiling = profile
+
+    def disable(self):
+        self.enabled = False
+        self.profiling = False
+
+    def add_hook(self, callback):
+        self._hooks.append(callback)
+
+    def remove_hook(self, callback):
+        self._hooks.remove(callback)
+
+    def span(self, name, **args):
+        """Context manager que mide el bloque como el intervalo name."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def record(self, name, start, end, **args):
+        """Registra un intervalo ya medido (para fases que no encajan en un bloque with)."""
+        if not self.enabled:
+            return
+        self._events.append((name, start, end, threading.get_ident(), args))
+        for callback in self._hooks:
+            callback(name, start, end - start, args)
+
+    def clear(self):
+        self._events.clear()
+
+    def summary(self):
+        """{nombre: (cantidad, total en segundos, máximo)} de los intervalos guardados."""
+        result = {}
+        for name, start, end, _, _ in list(self._events):
+            count, total, longest = result.get(name, (0, 0.0, 0.0))
+            result[name] = (count + 1, total + end - start, max(longest, end - start))
+        return result
+
+    def _profiled_call(self, func, args, kwargs):
+        """Ejecuta func bajo cProfile; las llamadas anidadas usan el perfilador de la externa."""
+        local = self._local
+        if getattr(local, "profiler", None) is not None:
+            return func(*args, **kwargs)
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Ya hay otro perfilador activo (por ejemplo en otro hilo en Python 3.12+)
+            return func(*args, **kwargs)
+        local.profiler = profiler
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            local.profiler = None
+            self._add_profile(profiler)
+
+    def _add_profile(self, profiler):
+        import pstats
+        with self._lock:
+            try:
+                if self._profile_stats is None:
+                    self._profile_stats = pstats.Stats(profiler)
+                else:
+                    self._profile_stats.add(profiler)
+            except TypeError:
+                # El perfilador no llegó a medir nada
+                pass
+
+    def print_profile(self, sort="cumulative", limit=25, stream=None):
+        """Muestra el perfil acumulado de las funciones @traced (si se activó profile)."""
+        with self._lock:
+            stats = self._profile_stats
+            if stats is None:
+                return
+            if stream is not None:
+                stats.stream = stream
+            stats.sort_stats(sort).print_stats(limit)
+
+    def export_chrome(self, path):
+        """Guarda los intervalos como eventos "X" del formato de trazas de Chrome."""
+        pid = os.getpid()
+        events = [{
+            "name": name,
+            "cat": name.split(".", 1)[0],
+            "ph": "X",
+            "ts": (start - self._origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": pid,
+            "tid": tid,
+            "args": args,
+        } for name, start, end, tid, args in list(self._events)]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+        return len(events)
+
+
+# Tracer compartido por q2query y q2rcon
+tracer = Tracer()
+
+
+def traced(name=None):
+    """
+    Decorador que mide cada llamada a la función como un intervalo, sólo mientras
+    tracer esté activado (y la perfila si además está profiling); apagado cuesta
+    una comprobación por llamada.
+    """
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(span_name):
+                if tracer.profiling:
+                    return tracer._profiled_call(func, args, kwargs)
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
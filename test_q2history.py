@@ -0,0 +1,47 @@
+#################################################################
+# Pruebas del historial por servidor                            #
+#################################################################
+# Ejecutar con: python -m pytest -q
+import q2history
+
+START = 1_699_999_200  # múltiplo de 3600: los intervalos por minuto y hora empiezan acá
+
+
+def _state(players):
+    return {"players": [{"ping": 50}] * players, "bots": []}
+
+
+def _store(seconds, interval=5):
+    store = q2history.MetricsStore()
+    for t in range(START, START + seconds, interval):
+        store.record("10.0.0.1", 27910, _state(4), rtt=0.05, when=t)
+    return store
+
+
+def test_query_uses_finest_level_covering_start():
+    store = _store(30 * 60)
+    now = START + 30 * 60
+    step, data = store.query("10.0.0.1", 27910, now - 600, now)
+    assert step == 0
+    assert len(data["time"]) == 120
+    assert data["players"][0] == 4
+
+
+def test_query_longer_than_history_uses_available_data():
+    # Media hora de muestras: el nivel por hora todavía está vacío
+    store = _store(30 * 60)
+    now = START + 30 * 60
+    step, data = store.query("10.0.0.1", 27910, now - 2 * 3600, now)
+    assert step == 0
+    assert len(data["time"]) == 360
+    assert data["time"][0] == START
+
+
+def test_query_longer_than_history_prefers_level_reaching_furthest():
+    # Tres horas: las muestras crudas (1 h) ya no llegan al inicio, los minutos sí
+    store = _store(3 * 3600)
+    now = START + 3 * 3600
+    step, data = store.query("10.0.0.1", 27910, now - 24 * 3600, now)
+    assert step == 60
+    assert data["time"][0] == START
+    assert data["rtt"][0] == 50.0
@@ -0,0 +1,79 @@
+#################################################################
+# Pruebas de la rotación y la lectura por páginas de los logs   #
+#################################################################
+# Ejecutar con: python -m pytest -q
+import os
+
+import q2log
+
+
+def _write(path, lines, **options):
+    writer = q2log.LogWriter(path, flush_interval=0, **options)
+    for line in lines:
+        writer.write(line)
+    writer.close()
+
+
+def test_old_log_is_rotated_before_writing(tmp_path):
+    path = str(tmp_path / "logs.txt")
+    with open(path, "w") as f:
+        f.write("2020-01-01 00:00:00 - viejo\n")
+    _write(path, ["nuevo"], max_age=3600)
+    # Las líneas nuevas quedan en el archivo actual, no en la copia
+    with open(path) as f:
+        assert f.read().endswith(" - nuevo\n")
+    with open(path + ".1") as f:
+        assert f.read() == "2020-01-01 00:00:00 - viejo\n"
+
+
+def test_size_rotation_never_leaves_current_log_empty(tmp_path):
+    path = str(tmp_path / "logs.txt")
+    for i in range(20):
+        _write(path, [f"linea {i}"], max_bytes=100, backup_count=2)
+        assert os.path.getsize(path) > 0
+        assert os.path.getsize(path) <= 100
+    assert not os.path.exists(path + ".3")
+
+
+def test_view_pages_into_rotated_files(tmp_path):
+    path = str(tmp_path / "logs.txt")
+    with open(path + ".2", "w") as f:
+        f.write("a\nb\n")
+    with open(path + ".1", "w") as f:
+        f.write("c\nd\n")
+    with open(path, "w") as f:
+        f.write("e\nf\n")
+    view = q2log.LogFileView(path, encoding="utf-8")
+    assert view.tail(1) == "f\n"
+    assert view.older(3) == "e\n"
+    assert view.older(3) == "c\nd\n"
+    assert view.older(1) == "b\n"
+    assert view.older(1) == "a\n"
+    assert view.older(1) == ""
+
+
+def test_view_follows_file_across_rotation(tmp_path):
+    path = str(tmp_path / "logs.txt")
+    with open(path, "w") as f:
+        f.write("a\nb\nc\n")
+    view = q2log.LogFileView(path, encoding="utf-8")
+    assert view.tail(1) == "c\n"
+    # Se rota mientras se lee: lo que faltaba sigue en logs.txt.1
+    os.replace(path, path + ".1")
+    with open(path, "w") as f:
+        f.write("x\n")
+    assert view.older(1) == "b\n"
+    assert view.older(5) == "a\n"
+    assert view.older(5) == ""
+
+
+def test_skip_history_ends_paging(tmp_path):
+    path = str(tmp_path / "logs.txt")
+    with open(path + ".1", "w") as f:
+        f.write("a\n")
+    with open(path, "w") as f:
+        f.write("b\n")
+    view = q2log.LogFileView(path, encoding="utf-8")
+    assert view.tail(5) == "b\n"
+    view.skip_history()
+    assert view.older(5) == ""
@@ -0,0 +1,59 @@
+#################################################################
+# Pruebas del cliente de servidor maestro con servidores falsos #
+#################################################################
+# Ejecutar con: python -m pytest -q
+import pytest
+
+import q2fake
+import q2query
+
+
+@pytest.fixture
+def game_servers():
+    """Tres servidores de D-Day y uno de otro juego, en el mismo hilo."""
+    names = iter(["Charlie", "alfa", "Bravo", "Otro juego"])
+    games = iter(["dday", "dday", "dday", "action"])
+    with q2fake.FakeServerThread(
+            lambda: q2fake.FakeQuake2Server(hostname=next(names), game=next(games)),
+            count=4) as servers:
+        yield servers
+
+
+def test_parse_master_packet_and_addresses():
+    servers = [("10.0.0.1", 27910), ("10.0.0.2", 27911), ("10.0.0.1", 27910), ("10.0.0.3", 0)]
+    packet, = q2fake.encode_master_response(servers)
+    data = q2query.parse_master_packet(packet)
+    # Los duplicados y los puertos 0 se descartan, el orden se mantiene
+    assert q2query.parse_master_addresses(data) == [("10.0.0.1", 27910), ("10.0.0.2", 27911)]
+    with pytest.raises(Exception):
+        q2query.parse_master_packet(b"\xff\xff\xff\xffprint\nhola")
+
+
+def test_get_server_data_master(game_servers):
+    master = q2fake.FakeMasterServer(game_servers.addresses, per_packet=2)
+    with q2fake.FakeServerThread(lambda: master) as masters:
+        servers = q2query.get_server_data_master(game="dday", masters=masters.addresses, timeout=2.0)
+    # Sólo los del juego pedido, ordenados por nombre
+    assert [srv["Hostname"] for srv in servers] == ["alfa", "Bravo", "Charlie"]
+    ip, port = game_servers.addresses[1]
+    assert servers[0]["IP"] == f"quake2://{ip}:{port}"
+    assert servers[0]["Game"] == "dday"
+    assert servers[0]["Map"] == "dday1"
+    assert servers[0]["Players"] == "8/16"
+
+
+def test_get_server_data_falls_back_to_html(monkeypatch):
+    html_servers = [{"Hostname": "web", "IP": "quake2://1.2.3.4:27910", "Game": "dday",
+                     "Map": "dday1", "Players": "0/16"}]
+    monkeypatch.setattr(q2query, "get_server_data_html", lambda: html_servers)
+    with q2fake.FakeServerThread(lambda: q2fake.FakeMasterServer([])) as masters:
+        assert q2query.get_server_data(game="dday", masters=masters.addresses) == html_servers
+
+
+def test_get_server_data_prefers_master(monkeypatch, game_servers):
+    def html_unexpected():
+        raise AssertionError("no debería recurrir a la página web")
+    monkeypatch.setattr(q2query, "get_server_data_html", html_unexpected)
+    with q2fake.FakeServerThread(lambda: q2fake.FakeMasterServer(game_servers.addresses)) as masters:
+        servers = q2query.get_server_data(game="dday", masters=masters.addresses)
+    assert len(servers) == 3